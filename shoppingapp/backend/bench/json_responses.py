@@ -0,0 +1,156 @@
+"""Micro-benchmark for JSON response serialization.
+
+Compares, for the signin success body (message plus two tokens) and the
+fixed signup body:
+
+    fastapi_default   return a dict: jsonable_encoder, then JSONResponse
+    fast_json         responses.json() with the standard library encoder
+    fast_orjson       responses.json() with orjson (if installed)
+    constant          responses.constant(), encoded once up front
+
+``render`` times building the response object alone. ``asgi`` times whole
+requests through a FastAPI app with no middleware (routing, handler and
+response), called in-process so only CPU time is measured. No database is
+needed.
+
+    cd shoppingapp/backend && PYTHONPATH=. python bench/json_responses.py --iterations 50000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from common import responses, tokens
+
+SIGNUP_BODY = {"message": "User registered successfully!"}
+
+
+def signin_body():
+    signer = tokens.TokenSigner([b"bench-secret"], "bench", access_ttl=900, refresh_ttl=3600)
+    return {
+        "message": "Sign-in successful!",
+        "access_token": signer.issue("bench-user", "access"),
+        "refresh_token": signer.issue("bench-user", "refresh"),
+        "token_type": "bearer",
+        "expires_in": 900,
+    }
+
+
+def encoders():
+    available = {"fast_json": responses._stdlib_dumps}
+    try:
+        import orjson
+
+        available["fast_orjson"] = orjson.dumps
+    except ImportError:
+        pass
+    return available
+
+
+def variants(body):
+    """name -> zero-argument callable returning a Response (or a dict)."""
+    constant = responses.constant(body)
+    found = {
+        "fastapi_default": lambda: JSONResponse(jsonable_encoder(body)),
+        "constant": constant,
+    }
+    for name, dumps in encoders().items():
+        found[name] = _with_encoder(dumps, body)
+    return found
+
+
+def _with_encoder(dumps, body):
+    class Response(responses.FastJSONResponse):
+        def render(self, content):
+            return dumps(content)
+
+    return lambda: Response(body)
+
+
+def bench_render(body, iterations):
+    results = {}
+    for name, make in variants(body).items():
+        started = time.perf_counter()
+        for _ in range(iterations):
+            make()
+        results[name] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+    return results
+
+
+def _endpoint(make):
+    # async, so FastAPI calls it on the event loop rather than the threadpool
+    async def endpoint():
+        return make()
+
+    return endpoint
+
+
+def _app(body):
+    app = FastAPI()
+    made = variants(body)
+    # A returned dict takes FastAPI's default path; the rest return responses
+    made["fastapi_default"] = lambda: body
+    for name, make in made.items():
+        app.add_api_route(f"/{name}", _endpoint(make), methods=["GET"])
+    return app, list(made)
+
+
+async def _request(app, path):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def bench_asgi(body, iterations):
+    app, names = _app(body)
+    results = {}
+    for name in names:
+        path = f"/{name}"
+        await _request(app, path)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await _request(app, path)
+        results[name] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50_000)
+    args = parser.parse_args()
+
+    results = {}
+    for label, body in (("signin", signin_body()), ("signup", SIGNUP_BODY)):
+        results[label] = {
+            "render_us": bench_render(body, args.iterations),
+            "asgi_us": asyncio.run(bench_asgi(body, args.iterations // 5)),
+        }
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
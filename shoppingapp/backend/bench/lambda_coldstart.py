@@ -0,0 +1,106 @@
+"""Local cold-start benchmark for the Lambda entry point.
+
+Each run starts a fresh interpreter, as a new Lambda instance would, and
+measures:
+
+    import          ``import common.lambda_handler``
+    first_request   the first invocation, including the lazy imports and
+                    the app startup (connection pool, hashing pool, caches)
+    warm_request    the second invocation
+
+The invocations are API Gateway HTTP API (payload 2.0) events for
+``--path``. Every path needs the database named by the usual ``DB_*``
+variables, even ``/health``: the first invocation runs the app's full
+startup, which opens the connection pool. ``modules`` counts what the
+interpreter has loaded after each phase, to catch heavy imports creeping
+onto the cold path. If a run fails, its stderr is printed.
+
+    cd shoppingapp/backend && PYTHONPATH=. python bench/lambda_coldstart.py --runs 5 --path /ready
+"""
+
+import argparse
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Runs inside the fresh interpreter; prints one JSON line
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import common.lambda_handler as lh
+imported = time.perf_counter()
+modules_after_import = len(sys.modules)
+event = json.loads(sys.argv[1])
+response = lh.handler(event, None)
+first = time.perf_counter()
+lh.handler(event, None)
+warm = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "first_request": first - imported,
+    "warm_request": warm - first,
+    "status": response["statusCode"],
+    "modules_after_import": modules_after_import,
+    "modules_after_request": len(sys.modules),
+}))
+"""
+
+
+def make_event(method, path, body):
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost", "content-type": "application/json", "user-agent": "lambda-coldstart"},
+        "requestContext": {
+            "accountId": "local",
+            "apiId": "local",
+            "domainName": "localhost",
+            "requestId": "coldstart",
+            "stage": "$default",
+            "http": {"method": method, "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1", "userAgent": "lambda-coldstart"},
+        },
+        "body": body or "",
+        "isBase64Encoded": False,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--body", default=None, help="JSON request body, e.g. for /signin")
+    args = parser.parse_args()
+
+    event = json.dumps(make_event(args.method, args.path, args.body))
+    env = dict(os.environ, PYTHONPATH=str(BACKEND))
+    # Required when signin is served; any strong key will do for a benchmark
+    env.setdefault("TOKEN_SECRET", secrets.token_hex(32))
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", CHILD, event], env=env, cwd=BACKEND, capture_output=True, text=True)
+        if out.returncode != 0:
+            sys.stderr.write(out.stderr)
+            raise SystemExit(f"run {len(runs) + 1} failed with exit status {out.returncode} (is the database up?)")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        key: {"median_ms": round(statistics.median(r[key] for r in runs) * 1000, 1), "max_ms": round(max(r[key] for r in runs) * 1000, 1)}
+        for key in ("import", "first_request", "warm_request")
+    }
+    summary["status"] = runs[-1]["status"]
+    summary["modules_after_import"] = runs[-1]["modules_after_import"]
+    summary["modules_after_request"] = runs[-1]["modules_after_request"]
+    print(json.dumps({"runs": args.runs, "method": args.method, "path": args.path, "results": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
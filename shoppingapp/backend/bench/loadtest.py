@@ -0,0 +1,265 @@
+"""Load test for /signin and /signup.
+
+Starts the signin and signup apps with uvicorn against the database named
+by the usual ``DB_*`` variables (a local Postgres, e.g. the ``postgres``
+service from docker-compose.yml), seeds test users, drives a weighted mix
+of requests at a fixed concurrency and prints a JSON report:
+
+    cd shoppingapp/backend
+    pip install -r bench/requirements.txt
+    PYTHONPATH=. python bench/loadtest.py --duration 30 --concurrency 64 \\
+        --mix valid=60,bad_password=15,unknown=15,signup=8,duplicate=2
+
+Where no Postgres is at hand, ``--embedded-postgres`` starts a throwaway one
+from the ``pgserver`` package (Postgres binaries installed with pip) in a
+temporary directory, points ``DB_*`` at its socket and deletes it
+afterwards. It is a real Postgres, so the numbers are comparable, but it
+shares the machine's CPU with the services and the load generator.
+
+The report has overall and per-scenario throughput, p50/p95/p99 latency,
+status code counts, responses that did not match the expected status, and
+the number of server connections to the database sampled during the run.
+Pass ``--signin-url``/``--signup-url`` to load already running services
+instead of starting local ones. Seeded and signed-up users share a per-run
+prefix and are deleted afterwards unless ``--keep-users`` is given.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import asyncpg
+import httpx
+
+from common import db, hashing
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+PASSWORD = "loadtest-password"
+
+# scenario -> (service, expected status)
+SCENARIOS = {
+    "valid": ("signin", 200),
+    "bad_password": ("signin", 401),
+    "unknown": ("signin", 401),
+    "signup": ("signup", 200),
+    "duplicate": ("signup", 400),
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def start_embedded_postgres():
+    """Start a throwaway Postgres and export its connection as ``DB_*``."""
+    import tempfile
+    from urllib.parse import parse_qs, urlparse
+
+    import pgserver
+
+    server = pgserver.get_server(tempfile.mkdtemp(prefix="loadtest-pg-"), cleanup_mode="delete")
+    socket_dir = parse_qs(urlparse(server.get_uri()).query)["host"][0]
+    os.environ.update(DB_HOST=socket_dir, DB_PORT="5432", DB_NAME="postgres", DB_USER="postgres", DB_PASSWORD="")
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(module, port, extra_env):
+    env = dict(os.environ, PYTHONPATH=str(BACKEND), **extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND / module,
+        env=env,
+    )
+
+
+async def wait_until_up(client, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(f"{url}/openapi.json")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout}s")
+
+
+async def seed_users(conn, prefix, count, rounds):
+    password_hash = hashing._hash(PASSWORD, rounds)
+    names = [f"{prefix}seed{i}" for i in range(count)]
+    await conn.copy_records_to_table(
+        "users",
+        records=[(name, password_hash) for name in names],
+        columns=("username", "password_hash"),
+    )
+    return names
+
+
+async def sample_connections(conn, database, samples, stop):
+    while not stop.is_set():
+        samples.append(
+            await conn.fetchval(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = $1 AND pid <> pg_backend_pid()",
+                database,
+            )
+        )
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarise(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+    }
+
+
+async def worker(client, urls, mix, seeded, prefix, deadline, results):
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        scenario = random.choices(names, weights)[0]
+        service, expected = SCENARIOS[scenario]
+        if scenario == "valid":
+            body = {"username": random.choice(seeded), "password": PASSWORD}
+        elif scenario == "bad_password":
+            body = {"username": random.choice(seeded), "password": "wrong-" + PASSWORD}
+        elif scenario == "unknown":
+            body = {"username": f"{prefix}ghost{uuid.uuid4().hex}", "password": PASSWORD}
+        elif scenario == "signup":
+            body = {"username": f"{prefix}new{uuid.uuid4().hex}", "password": PASSWORD}
+        else:
+            body = {"username": random.choice(seeded), "password": PASSWORD}
+
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"{urls[service]}/{service}", json=body)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        result = results[scenario]
+        result["latencies"].append(time.perf_counter() - started)
+        result["statuses"][str(status)] = result["statuses"].get(str(status), 0) + 1
+        if status != expected:
+            result["unexpected"] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default="valid=60,bad_password=15,unknown=15,signup=8,duplicate=2")
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.environ.get("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--signin-url")
+    parser.add_argument("--signup-url")
+    parser.add_argument("--keep-users", action="store_true")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting on in the started services")
+    parser.add_argument("--embedded-postgres", action="store_true", help="run against a throwaway Postgres from pgserver")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    postgres = start_embedded_postgres() if args.embedded_postgres else None
+    prefix = f"lt{uuid.uuid4().hex[:8]}-"
+    servers = []
+    urls = {"signin": args.signin_url, "signup": args.signup_url}
+    server_env = {"BCRYPT_ROUNDS": str(args.bcrypt_rounds)}
+    if not args.rate_limit:
+        # All load comes from one IP and a few hundred usernames
+        server_env.update(RATE_LIMIT_IP_RATE="0", RATE_LIMIT_USER_RATE="0")
+    for service in ("signin", "signup"):
+        if not urls[service]:
+            port = free_port()
+            servers.append(start_server(service, port, server_env))
+            urls[service] = f"http://127.0.0.1:{port}"
+
+    conn = await asyncpg.connect(**db.connect_kwargs())
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            for url in urls.values():
+                await wait_until_up(client, url)
+            seeded = await seed_users(conn, prefix, args.seed_users, args.bcrypt_rounds)
+
+            results = {name: {"latencies": [], "statuses": {}, "unexpected": 0} for name in mix}
+            samples, stop = [], asyncio.Event()
+            sampler = asyncio.create_task(sample_connections(conn, db.connect_kwargs()["database"], samples, stop))
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(
+                *(worker(client, urls, mix, seeded, prefix, deadline, results) for _ in range(args.concurrency))
+            )
+            elapsed = time.monotonic() - started
+            stop.set()
+            await sampler
+
+        report = {
+            "config": {
+                "duration_s": args.duration,
+                "concurrency": args.concurrency,
+                "mix": mix,
+                "seed_users": args.seed_users,
+                "bcrypt_rounds": args.bcrypt_rounds,
+            },
+            "overall": summarise([t for r in results.values() for t in r["latencies"]], elapsed),
+            "scenarios": {
+                name: dict(summarise(r["latencies"], elapsed), statuses=r["statuses"], unexpected=r["unexpected"])
+                for name, r in results.items()
+            },
+            "db_connections": {
+                "min": min(samples, default=None),
+                "max": max(samples, default=None),
+                "mean": round(sum(samples) / len(samples), 1) if samples else None,
+            },
+        }
+        if not args.keep_users:
+            await conn.execute("DELETE FROM users WHERE username LIKE $1", prefix + "%")
+    finally:
+        await conn.close()
+        for server in servers:
+            server.terminate()
+            server.wait(timeout=30)
+        if postgres is not None:
+            postgres.cleanup()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Micro-benchmark for the signin user lookup.
+
+Compares the old lookup (``SELECT *`` with no prepared-statement reuse, the
+way the psycopg2 version ran it) with the current one (``SELECT
+password_hash`` through asyncpg's per-connection prepared statement cache).
+
+Each variant gets its own connection and a temporary ``users`` table that
+shadows the real one, so the benchmark never touches production rows.
+
+    cd shoppingapp/backend && PYTHONPATH=. python bench/signin_lookup.py --users 100000 --lookups 20000
+
+Connection settings come from the usual ``DB_*`` environment variables.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import asyncpg
+
+from common import db
+
+# bcrypt-shaped (60 chars), so rows are the same size as production rows
+SAMPLE_HASH = "$2b$12$ckm1xJ6WbXbWmKp5ws1a3uVkO8/DKW8Xj2pVbFEX7fQ0Ew1N3uY0e"
+
+VARIANTS = {
+    "select_star_unprepared": ("SELECT * FROM users WHERE username = $1", 0, "fetchrow"),
+    "select_hash_prepared": ("SELECT password_hash FROM users WHERE username = $1", 100, "fetchval"),
+}
+
+
+async def run_variant(sql, cache_size, method, users, lookups):
+    conn = await asyncpg.connect(statement_cache_size=cache_size, **db.connect_kwargs())
+    try:
+        await conn.execute(
+            """
+            CREATE TEMP TABLE users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR(255) NOT NULL,
+                password_hash VARCHAR(255) NOT NULL
+            );
+            CREATE UNIQUE INDEX ON users (username);
+            """
+        )
+        await conn.copy_records_to_table(
+            "users",
+            records=((f"user{i}", SAMPLE_HASH) for i in range(users)),
+            columns=("username", "password_hash"),
+            schema_name="pg_temp",
+        )
+        await conn.execute("ANALYZE pg_temp.users")
+
+        fetch = getattr(conn, method)
+        names = [f"user{random.randrange(users)}" for _ in range(lookups)]
+        for name in names[:100]:
+            await fetch(sql, name)
+
+        latencies = []
+        started = time.perf_counter()
+        for name in names:
+            t0 = time.perf_counter()
+            await fetch(sql, name)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        await conn.close()
+
+    latencies.sort()
+    return {
+        "lookups_per_second": round(lookups / elapsed, 1),
+        "mean_us": round(statistics.fmean(latencies) * 1e6, 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, (sql, cache_size, method) in VARIANTS.items():
+        results[name] = await run_variant(sql, cache_size, method, args.users, args.lookups)
+    print(json.dumps({"users": args.users, "lookups": args.lookups, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
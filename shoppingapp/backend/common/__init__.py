@@ -0,0 +1 @@
+"""Code shared by the signin and signup services."""
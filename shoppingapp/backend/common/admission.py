@@ -0,0 +1,216 @@
+"""Admission control and load shedding for the auth endpoints.
+
+Every guarded route has its own concurrency cap and wait-queue length, and
+all guarded routes in a process also share a global concurrency cap. When
+a slot frees up, waiting requests of the highest priority (lowest number)
+are admitted first, so signin keeps flowing while signup waits. A request
+that finds its queue full, or waits longer than the queue timeout, gets an
+immediate 503 with ``Retry-After`` instead of piling on to the latency.
+
+Admitted requests end up as bcrypt jobs in the hashing pool's FIFO queue,
+so the caps are sized from its worker count (``hashing.worker_count()``):
+a route's ``Route`` gives its concurrency and queue per hashing worker,
+and the global cap defaults to twice the workers. An admitted request then
+waits behind at most about one bcrypt job per worker, and signin's
+priority decides who gets the slots instead of the executor's queue. On a
+pod with one hashing worker that is 2 signins (or 1 signup) in flight.
+Routes with ``scaled=False``, such as the bulk jobs, use fixed numbers.
+
+Routes with ``shared=False`` are left out of the global cap and only
+limited by their own. The bulk jobs are: each holds its slot for as long
+as its upload streams, and counted against the global cap a single import
+would leave interactive signins with half of it, and two would shut them
+out entirely.
+
+Configuration (``<ROUTE>`` is the path without slashes, e.g. ``SIGNIN``):
+
+    ADMISSION_CONCURRENCY         global in-flight cap (default 2 per
+                                  hashing worker)
+    ADMISSION_<ROUTE>_CONCURRENCY per-route in-flight cap, absolute
+    ADMISSION_<ROUTE>_QUEUE       per-route wait-queue length, absolute
+    ADMISSION_QUEUE_TIMEOUT       seconds a request may wait (default 2)
+    ADMISSION_RETRY_AFTER         Retry-After value in seconds (default 1)
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import NamedTuple
+
+from common import hashing, metrics, responses
+
+
+_BUSY = responses.constant({"detail": "Server busy, retry later"}, 503)
+
+
+class Route(NamedTuple):
+    priority: int
+    concurrency: float
+    queue: float
+    # concurrency and queue are per hashing worker, unless False
+    scaled: bool = True
+    # counts against the global cap, unless False
+    shared: bool = True
+
+
+class _Gate:
+    def __init__(self, name, route, workers):
+        prefix = f"ADMISSION_{name.strip('/').replace('/', '_').upper()}"
+        scale = workers if route.scaled else 1
+        self.name = name
+        self.priority = route.priority
+        self.shared = route.shared
+        self.limit = int(os.environ.get(f"{prefix}_CONCURRENCY", max(1, round(route.concurrency * scale))))
+        self.queue_limit = int(os.environ.get(f"{prefix}_QUEUE", round(route.queue * scale)))
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+
+class AdmissionController:
+    def __init__(self, limit, queue_timeout, workers=1):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.workers = workers
+        self.active = 0
+        self.gates = {}
+        self._waiters = {}
+
+    def add_route(self, path, route):
+        self.gates[path] = _Gate(path, route, self.workers)
+        self._waiters.setdefault(route.priority, deque())
+
+    def _has_room(self, gate):
+        return (self.active < self.limit or not gate.shared) and gate.active < gate.limit
+
+    def _start(self, gate):
+        if gate.shared:
+            self.active += 1
+        gate.active += 1
+
+    async def acquire(self, gate):
+        """Wait for a slot; False means the request should be shed."""
+        # Waiters of higher priority still queued while there is global room
+        # are only held back by their own route's cap, so they do not block
+        # this one; waiters of the same route do, to keep it first-come
+        if self._has_room(gate) and not gate.waiting:
+            self._start(gate)
+            return True
+        if gate.waiting >= gate.queue_limit:
+            gate.rejected += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, gate)
+        self._waiters[gate.priority].append(entry)
+        gate.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            if future.done():
+                # Admitted just as the timeout fired; keep the slot
+                return True
+            self._forget(entry)
+            gate.rejected += 1
+            return False
+        except BaseException:
+            # Client went away while queued
+            if future.done():
+                self.release(gate)
+            else:
+                self._forget(entry)
+            raise
+
+    def _forget(self, entry):
+        future, gate = entry
+        self._waiters[gate.priority].remove(entry)
+        gate.waiting -= 1
+        future.cancel()
+
+    def release(self, gate):
+        if gate.shared:
+            self.active -= 1
+        gate.active -= 1
+        self._wake()
+
+    def _wake(self):
+        for priority in sorted(self._waiters):
+            waiters = self._waiters[priority]
+            for entry in list(waiters):
+                future, gate = entry
+                if self._has_room(gate):
+                    waiters.remove(entry)
+                    gate.waiting -= 1
+                    self._start(gate)
+                    future.set_result(None)
+
+    def stats(self):
+        stats = {"active": self.active, "limit": self.limit}
+        for path, gate in self.gates.items():
+            name = path.strip("/").replace("/", "_")
+            stats[f"{name}_active"] = gate.active
+            stats[f"{name}_waiting"] = gate.waiting
+            stats[f"{name}_rejected"] = gate.rejected
+        return stats
+
+
+_controller = None
+
+
+def get_controller():
+    """The process-wide controller, shared by every app in the process."""
+    global _controller
+    if _controller is None:
+        workers = hashing.worker_count()
+        _controller = AdmissionController(
+            limit=int(os.environ.get("ADMISSION_CONCURRENCY", 0)) or 2 * workers,
+            queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2")),
+            workers=workers,
+        )
+    return _controller
+
+
+def stats():
+    return _controller.stats() if _controller is not None else None
+
+
+metrics.register_gauges("admission", stats)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the controller to the guarded paths."""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+        self.retry_after = os.environ.get("ADMISSION_RETRY_AFTER", "1")
+
+    async def __call__(self, scope, receive, send):
+        # CORS preflights cost nothing and are never queued or shed
+        guarded = scope["type"] == "http" and scope["method"] != "OPTIONS"
+        gate = self.controller.gates.get(scope["path"]) if guarded else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire(gate):
+            await self._reject(scope, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(gate)
+
+    async def _reject(self, scope, send):
+        response = _BUSY()
+        response.raw_headers.append((b"retry-after", self.retry_after.encode()))
+        await response(scope, None, send)
+
+
+def install(app, routes):
+    """Guard ``routes`` (a ``{path: Route}`` dict) on ``app``."""
+    controller = get_controller()
+    for path, route in routes.items():
+        controller.add_route(path, route)
+    app.add_middleware(AdmissionMiddleware, controller=controller)
@@ -0,0 +1,96 @@
+"""App factory for the auth services.
+
+``create_app(["signin", "signup"])`` mounts the routers of the named
+services on one FastAPI app. Whatever it mounts shares one connection
+pool, one hashing pool and one set of caches, so a single process can
+serve both services instead of running two deployments that each hold
+their own idle connections and warm caches.
+
+``signin/signin.py`` and ``signup/signup.py`` are thin entry points that
+call it with the services listed in ``AUTH_SERVICES``, defaulting to
+their own. Setting ``AUTH_SERVICES=signin,signup`` on either deployment
+makes it serve both.
+"""
+
+import importlib
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from common import admission, credcache, db, hashing, health, metrics, migrations, ratelimit, responses, revocation, tokens, usernames, validation
+
+# Router modules are imported only for the services an app serves
+SERVICES = {"signin": "common.routers.signin", "signup": "common.routers.signup"}
+
+
+def services_from_env(default):
+    """Service names from ``AUTH_SERVICES`` (comma separated), or ``default``."""
+    names = [name.strip() for name in os.environ.get("AUTH_SERVICES", default).split(",") if name.strip()]
+    unknown = set(names) - set(SERVICES)
+    if unknown:
+        raise ValueError(f"AUTH_SERVICES: unknown services {', '.join(sorted(unknown))}")
+    return names
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One connection pool, one hashing pool and one set of caches per
+    # process, whichever services it serves
+    await db.init_pool()
+    if migrations.migrate_on_startup():
+        await migrations.migrate()
+    hashing.init_executor()
+    await usernames.start_cache()
+    credcache.init_cache()
+    await revocation.start_index()
+    yield
+    await revocation.stop_index()
+    credcache.clear_cache()
+    await usernames.stop_cache()
+    hashing.shutdown_executor()
+    await db.close_pool()
+
+
+def create_app(services=("signin", "signup")):
+    """A FastAPI app serving the routes of ``services``."""
+    modules = [importlib.import_module(SERVICES[name]) for name in services]
+    if "signin" in services:
+        # A weak TOKEN_SECRET stops the app here rather than at the first signin
+        tokens.get_signer()
+
+    app = FastAPI(lifespan=lifespan, default_response_class=responses.FastJSONResponse)
+    responses.install(app)
+
+    # Bounded concurrency and queueing; sheds load with 503 + Retry-After
+    admission.install(app, {path: route for module in modules for path, route in module.ADMISSION.items()})
+
+    # Per-IP and per-username token buckets; abusive clients get 429 before
+    # any DB or hash work
+    ratelimit.install(app, {path: keys for module in modules for path, keys in module.RATE_LIMITS.items()})
+
+    # Body size cap, outside the rate limiter since that reads the body; and
+    # 422s that do not echo the rejected input
+    validation.install(app, {path: limit for module in modules for path, limit in module.BODY_LIMITS.items()})
+
+    # Request/stage latency histograms and the /metrics route for Prometheus
+    metrics.install(app)
+
+    # /health (liveness) and /ready (readiness) for the Kubernetes probes
+    health.install(app)
+
+    # Added last, so it is outermost: preflights are answered before any
+    # guard sees them, and 413/429/503 responses carry the CORS headers the
+    # frontend needs to read them
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],  # In production, specify actual origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    for module in modules:
+        app.include_router(module.router)
+    return app
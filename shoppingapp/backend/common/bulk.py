@@ -0,0 +1,398 @@
+"""Bulk user import and credential checks over streamed NDJSON or CSV.
+
+A file goes in and one result per row comes out, for two jobs:
+
+    import   ``POST /signup/bulk``, or ``python -m common.bulk FILE``
+    verify   ``POST /signin/bulk``, or ``python -m common.bulk --verify FILE``
+
+    cd shoppingapp/backend
+    PYTHONPATH=. python -m common.bulk users.ndjson > results.ndjson
+    PYTHONPATH=. python -m common.bulk users.csv --format csv --rounds 10
+    PYTHONPATH=. python -m common.bulk --verify credentials.ndjson > results.ndjson
+
+NDJSON has one object per line; CSV has a header row naming the columns,
+and one row per line. Input must be UTF-8; a row that is not is reported
+as invalid rather than having its password silently altered. Rows are handled ``BULK_CHUNK_SIZE`` (default 1000)
+at a time, so memory stays flat however long the file is, and results are
+streamed back chunk by chunk. Each result is ``{"line": n, "username":
+..., "status": ..., "error": ...}``, in input order, followed by a final
+``{"summary": {...}}``.
+
+Import rows carry a ``username`` and either a plaintext ``password`` or an
+existing bcrypt ``password_hash`` (as exported by another shop). For each
+chunk:
+
+    1. rows are validated with the signup rules, and usernames repeated in
+       the chunk or already in ``users`` are reported as duplicates
+       without hashing anything
+    2. plaintext passwords are hashed on the hashing pool, as many at a
+       time as it has workers (a process pool uses every core)
+    3. the rows are loaded with ``COPY`` into a temporary table and moved
+       into ``users`` with ``INSERT ... ON CONFLICT DO NOTHING``, which
+       catches usernames that another signup took in the meantime
+
+The ``users_added`` trigger (migration 4) still fires for every inserted
+row, so each chunk sends one ``pg_notify`` per new user when it commits.
+This is on purpose: it is how every pod's username cache learns about
+the imported users, which would otherwise get 401 from signin until the
+next full rebuild.
+
+Pre-hashed rows are limited only by ``COPY`` and run at thousands of rows
+per second. Plaintext rows cost one bcrypt hash each; ``--rounds`` (or
+``BULK_BCRYPT_ROUNDS``) can hash them at a lower cost for the import, and
+signin brings them up to ``BCRYPT_ROUNDS`` at each user's next login.
+Statuses are ``created``, ``duplicate`` and ``invalid``.
+
+Verify rows carry a ``username`` and a ``password``, for migration checks
+and password audits. Each chunk fetches every stored hash with one
+``WHERE username = ANY(...)`` query, then checks the passwords on the
+hashing pool the same way. Unlike signin, nothing is cached and no hash is
+upgraded. Statuses are ``match``, ``mismatch``, ``unknown`` (no such
+user), ``error`` (the stored hash could not be checked) and ``invalid``.
+"""
+
+import argparse
+import asyncio
+import csv
+import hmac
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError, model_validator
+from starlette.responses import StreamingResponse
+
+from common import db, hashing, metrics
+from common.validation import BcryptHash, NewPassword, NewUsername, Password, Username
+
+FORMATS = ("ndjson", "csv")
+
+# A line longer than this is treated as a broken file rather than buffered
+MAX_LINE_BYTES = 64 * 1024
+
+
+class BulkError(Exception):
+    """The input cannot be read any further."""
+
+
+class BulkUser(BaseModel):
+    username: NewUsername
+    password: Optional[NewPassword] = None
+    password_hash: Optional[BcryptHash] = None
+
+    @model_validator(mode="after")
+    def _one_secret(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("exactly one of password and password_hash is required")
+        return self
+
+
+class BulkCredential(BaseModel):
+    username: Username
+    password: Password
+
+
+def chunk_size():
+    return int(os.environ.get("BULK_CHUNK_SIZE", "1000"))
+
+
+def import_rounds():
+    return int(os.environ.get("BULK_BCRYPT_ROUNDS", "0")) or None
+
+
+def check_token(authorization, setting):
+    """True if ``authorization`` carries the token in env var ``setting``; None if that is unset."""
+    expected = os.environ.get(setting)
+    if not expected:
+        return None
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), expected.encode())
+
+
+def detect_format(name, content_type):
+    name = (name or "").lower() or ("csv" if "csv" in (content_type or "") else "ndjson")
+    if name not in FORMATS:
+        raise BulkError(f"format must be one of {', '.join(FORMATS)}")
+    return name
+
+
+def _check_length(line):
+    if len(line) > MAX_LINE_BYTES:
+        raise BulkError(f"line longer than {MAX_LINE_BYTES} bytes")
+    return line
+
+
+async def _lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _check_length(line)
+        # Checked before the next chunk, so an unterminated line is never
+        # buffered much past the limit
+        _check_length(buffer)
+    if buffer:
+        yield buffer
+
+
+async def read_rows(chunks, fmt):
+    """``(line, data, error)`` for each non-blank line of a byte stream."""
+    header = None
+    line_no = 0
+    async for raw in _lines(chunks):
+        line_no += 1
+        try:
+            text = raw.decode("utf-8-sig" if line_no == 1 else "utf-8").rstrip("\r")
+        except UnicodeDecodeError:
+            if fmt == "csv" and header is None:
+                raise BulkError("CSV header is not valid UTF-8")
+            yield line_no, None, "invalid UTF-8"
+            continue
+        if not text.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                data = json.loads(text)
+            except ValueError:
+                yield line_no, None, "invalid JSON"
+                continue
+            if not isinstance(data, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+        else:
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            data = {name: value for name, value in zip(header, values) if value != ""}
+        yield line_no, data, None
+
+
+def _error_message(error):
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+
+
+async def _on_pool(fn, calls):
+    """``await fn(*args)`` for each of ``calls``; a failed call returns its exception."""
+    # Keep at most one job per worker queued, so live signins and signups
+    # sharing the pool are not stuck behind a whole chunk
+    limit = asyncio.Semaphore(hashing.get_executor().workers)
+
+    async def one(args):
+        async with limit:
+            return await fn(*args)
+
+    return await asyncio.gather(*(one(args) for args in calls), return_exceptions=True)
+
+
+async def _import_chunk(chunk, rounds):
+    results = {}
+    first_seen = {}
+    for line, user in chunk:
+        if user.username in first_seen:
+            results[line] = ("duplicate", f"repeats line {first_seen[user.username]}")
+        else:
+            first_seen[user.username] = line
+
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            existing = {
+                row["username"]
+                for row in await conn.fetch("SELECT username FROM users WHERE username = ANY($1::text[])", list(first_seen))
+            }
+
+    pending = [(line, user) for line, user in chunk if line not in results and user.username not in existing]
+    for line, user in chunk:
+        if line not in results and user.username in existing:
+            results[line] = ("duplicate", "username already exists")
+
+    plaintext = [(user.password, rounds) for _, user in pending if user.password is not None]
+    hashes = await _on_pool(hashing.hash_password, plaintext)
+    for result in hashes:
+        if isinstance(result, BaseException):
+            raise result
+    hashes = iter(hashes)
+    records = [(user.username, user.password_hash or next(hashes)) for _, user in pending]
+
+    if records:
+        async with db.transaction() as conn:
+            with metrics.stage("db_query"):
+                # Kept per connection and emptied at commit, so prepared
+                # statements that use it stay valid
+                await conn.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS bulk_users (username TEXT, password_hash TEXT) ON COMMIT DELETE ROWS"
+                )
+                await conn.copy_records_to_table("bulk_users", records=records, columns=("username", "password_hash"))
+                inserted = {
+                    row["username"]
+                    for row in await conn.fetch(
+                        "INSERT INTO users (username, password_hash) SELECT username, password_hash FROM bulk_users "
+                        "ON CONFLICT DO NOTHING RETURNING username"
+                    )
+                }
+    else:
+        inserted = set()
+
+    for line, user in pending:
+        results[line] = ("created", None) if user.username in inserted else ("duplicate", "username already exists")
+    return [
+        {"line": line, "username": user.username, "status": results[line][0], "error": results[line][1]} for line, user in chunk
+    ]
+
+
+async def _verify_chunk(chunk):
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            stored = {
+                row["username"]: row["password_hash"]
+                for row in await conn.fetch(
+                    "SELECT username, password_hash FROM users WHERE username = ANY($1::text[])",
+                    list({credential.username for _, credential in chunk}),
+                )
+            }
+
+    known = [(line, credential) for line, credential in chunk if credential.username in stored]
+    outcomes = await _on_pool(
+        hashing.verify_password, [(credential.password, stored[credential.username]) for _, credential in known]
+    )
+    results = {line: ("unknown", None) for line, credential in chunk if credential.username not in stored}
+    for (line, _), outcome in zip(known, outcomes):
+        if isinstance(outcome, BaseException):
+            results[line] = ("error", f"stored hash could not be checked: {outcome}")
+        else:
+            results[line] = ("match", None) if outcome else ("mismatch", None)
+    return [
+        {"line": line, "username": credential.username, "status": results[line][0], "error": results[line][1]}
+        for line, credential in chunk
+    ]
+
+
+def run_import(chunks, fmt, size=None, rounds=None):
+    """Import users from an async iterator of byte chunks; yields result dicts."""
+    rounds = rounds or import_rounds()
+    return _run(chunks, fmt, size, BulkUser, lambda batch: _import_chunk(batch, rounds), ("created", "duplicate"))
+
+
+def run_verify(chunks, fmt, size=None):
+    """Check credentials from an async iterator of byte chunks; yields result dicts."""
+    return _run(chunks, fmt, size, BulkCredential, _verify_chunk, ("match", "mismatch", "unknown", "error"))
+
+
+async def _run(chunks, fmt, size, model, process_chunk, statuses):
+    size = size or chunk_size()
+    counts = dict.fromkeys(statuses + ("invalid",), 0)
+    started = time.perf_counter()
+    batch = []
+    # Results for invalid rows, held back with the chunk they were read in
+    # so that results come out in input order
+    rejected = []
+
+    async def flush():
+        results = await process_chunk(batch) if batch else []
+        for result in results:
+            counts[result["status"]] += 1
+        results = sorted(results + rejected, key=lambda result: result["line"])
+        batch.clear()
+        rejected.clear()
+        return results
+
+    error = None
+    try:
+        async for line, data, problem in read_rows(chunks, fmt):
+            if problem is None:
+                try:
+                    batch.append((line, model.model_validate(data)))
+                except ValidationError as e:
+                    problem = _error_message(e)
+            if problem is not None:
+                counts["invalid"] += 1
+                rejected.append({"line": line, "username": (data or {}).get("username"), "status": "invalid", "error": problem})
+            if len(batch) + len(rejected) >= size:
+                for result in await flush():
+                    yield result
+    except BulkError as e:
+        error = str(e)
+    # Including rows read before a break in the input
+    if batch or rejected:
+        for result in await flush():
+            yield result
+
+    elapsed = time.perf_counter() - started
+    summary = {**counts, "seconds": round(elapsed, 3), "rows_per_second": round(sum(counts.values()) / elapsed, 1) if elapsed else None}
+    if error:
+        summary["error"] = error
+    yield {"summary": summary}
+
+
+async def ndjson(results):
+    async for result in results:
+        yield json.dumps(result).encode() + b"\n"
+
+
+class ResultsResponse(StreamingResponse):
+    """Streams NDJSON results while the request body is still being read.
+
+    StreamingResponse normally also reads the request to watch for a
+    disconnect, which would take body chunks away from the job.
+    """
+
+    def __init__(self, results):
+        super().__init__(ndjson(results), media_type="application/x-ndjson")
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+async def _file_chunks(path, block=64 * 1024):
+    with open(path, "rb") if path != "-" else sys.stdin.buffer as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                return
+            yield data
+            # Let the pool's and executor's callbacks run between blocks
+            await asyncio.sleep(0)
+
+
+async def _main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Bulk-import users, or check credentials in bulk.")
+    parser.add_argument("path", help="NDJSON or CSV file, or - for stdin")
+    parser.add_argument("--verify", action="store_true", help="check username/password rows instead of importing them")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else ndjson")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows per chunk (default BULK_CHUNK_SIZE or 1000)")
+    parser.add_argument("--rounds", type=int, default=None, help="bcrypt cost for plaintext passwords")
+    parser.add_argument("--output", default="-", help="where to write per-row results (default stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # Hash on every core unless configured otherwise
+    os.environ.setdefault("HASH_EXECUTOR", "process")
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+
+    await db.init_pool()
+    hashing.init_executor()
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        if args.verify:
+            results = run_verify(_file_chunks(args.path), fmt, args.chunk_size)
+        else:
+            results = run_import(_file_chunks(args.path), fmt, args.chunk_size, args.rounds)
+        async for result in results:
+            if "summary" in result:
+                print(json.dumps(result["summary"]), file=sys.stderr)
+            else:
+                out.write(json.dumps(result) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        hashing.shutdown_executor()
+        await db.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,107 @@
+"""Short-lived cache of recently verified credentials for signin.
+
+Clients retry signin aggressively, and every retry would otherwise run a
+full bcrypt verify. After a successful verify, signin stores a tag for the
+username:
+
+    HMAC-SHA256(process key, stored password_hash + submitted password)
+
+The tag holds no plaintext, and the key is random per process and kept
+only in its memory. That keeps passwords out of the cache itself, but it
+does not protect them from anyone who can read the process's memory, since
+the key is there too. A later signin with the same password, checked
+against the same stored hash, produces the same tag and skips bcrypt. When
+the password changes, the stored hash changes and the old entry stops
+matching, even if the change was made by another pod, so entries never
+need to be invalidated; a rehash at login just stores the new tag.
+
+Configuration:
+
+    CRED_CACHE_TTL    seconds an entry stays valid (default 0 = disabled)
+    CRED_CACHE_SIZE   max entries, least recently used evicted (default 10000)
+"""
+
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+
+from common import metrics
+
+
+class VerifiedCredentials:
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _tag(self, password, password_hash):
+        message = password_hash.encode() + b"\0" + password.encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, username, password, password_hash):
+        """True if this exact password was verified against this hash recently."""
+        entry = self._entries.get(username)
+        if entry is not None:
+            tag, expires = entry
+            if expires > time.monotonic() and hmac.compare_digest(tag, self._tag(password, password_hash)):
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return True
+            if expires <= time.monotonic():
+                del self._entries[username]
+        self.misses += 1
+        return False
+
+    def remember(self, username, password, password_hash):
+        self._entries[username] = (self._tag(password, password_hash), time.monotonic() + self.ttl)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_cache = None
+
+
+def init_cache():
+    """Create the cache, unless ``CRED_CACHE_TTL`` is 0."""
+    global _cache
+    ttl = float(os.environ.get("CRED_CACHE_TTL", "0"))
+    if ttl > 0 and _cache is None:
+        _cache = VerifiedCredentials(ttl, int(os.environ.get("CRED_CACHE_SIZE", "10000")))
+    return _cache
+
+
+def clear_cache():
+    global _cache
+    _cache = None
+
+
+def check(username, password, password_hash):
+    return _cache is not None and _cache.check(username, password, password_hash)
+
+
+def remember(username, password, password_hash):
+    if _cache is not None:
+        _cache.remember(username, password, password_hash)
+
+
+def stats():
+    return _cache.stats() if _cache is not None else None
+
+
+metrics.register_gauges("cred_cache", stats)
@@ -0,0 +1,126 @@
+"""Process-wide asyncio PostgreSQL connection pool.
+
+The pool is created once from the app lifespan with ``init_pool()`` and
+drained with ``close_pool()``. Handlers borrow a connection with
+``connection()``, or with ``transaction()`` when they write:
+
+    async with db.connection() as conn:
+        row = await conn.fetchrow("SELECT ... WHERE username = $1", username)
+
+Configuration comes from the ``DB_*`` environment variables:
+
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD   connection target
+    DB_POOL_MIN_SIZE   connections opened at startup (default 1)
+    DB_POOL_MAX_SIZE   hard cap on open connections (default 10)
+    DB_POOL_TIMEOUT    seconds to wait for a free connection (default 5)
+    DB_POOL_MAX_IDLE   seconds an idle connection is kept before it is
+                       recycled (default 300, 0 disables recycling)
+    DB_STATEMENT_CACHE_SIZE
+                       prepared statements cached per connection
+                       (default 100; set 0 behind PgBouncer in
+                       transaction mode)
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+from common import metrics
+
+
+class PoolTimeout(Exception):
+    """No connection became available within ``DB_POOL_TIMEOUT``."""
+
+
+_pool = None
+_timeout = 5.0
+
+
+def connect_kwargs():
+    """asyncpg connection arguments from the ``DB_*`` variables."""
+    return {
+        "host": os.environ.get("DB_HOST"),
+        "database": os.environ.get("DB_NAME"),
+        "user": os.environ.get("DB_USER"),
+        "password": os.environ.get("DB_PASSWORD"),
+        "port": int(os.environ.get("DB_PORT", "5432")),
+    }
+
+
+async def init_pool():
+    """Create the process-wide pool. Safe to call more than once."""
+    global _pool, _timeout
+    if _pool is None:
+        _timeout = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+        _pool = await asyncpg.create_pool(
+            min_size=int(os.environ.get("DB_POOL_MIN_SIZE", "1")),
+            max_size=int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            max_inactive_connection_lifetime=float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+            statement_cache_size=int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100")),
+            **connect_kwargs(),
+        )
+    return _pool
+
+
+async def close_pool():
+    """Close every pooled connection. Called once at shutdown.
+
+    Waits up to ``DB_POOL_TIMEOUT`` for borrowed connections to come back,
+    then terminates whatever is left.
+    """
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        try:
+            await asyncio.wait_for(pool.close(), _timeout)
+        except asyncio.TimeoutError:
+            pool.terminate()
+
+
+def stats():
+    if _pool is None:
+        return None
+    size, idle = _pool.get_size(), _pool.get_idle_size()
+    return {"size": size, "idle": idle, "in_use": size - idle, "max_size": _pool.get_max_size()}
+
+
+metrics.register_gauges("db_pool", stats)
+
+
+def get_pool():
+    if _pool is None:
+        raise RuntimeError("database pool is not initialised; call init_pool() first")
+    return _pool
+
+
+@asynccontextmanager
+async def connection(timeout=None):
+    """Borrow a pooled connection and always hand it back.
+
+    Waits at most ``timeout`` seconds (default ``DB_POOL_TIMEOUT``).
+    """
+    pool = get_pool()
+    timeout = _timeout if timeout is None else timeout
+    try:
+        with metrics.stage("db_connect"):
+            conn = await pool.acquire(timeout=timeout)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f"no database connection available after {timeout}s") from None
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+@asynccontextmanager
+async def transaction():
+    """Borrow a pooled connection inside a transaction.
+
+    Commits when the block exits normally and rolls back when it raises,
+    including on ``HTTPException``. The connection is returned either way.
+    """
+    async with connection() as conn:
+        async with conn.transaction():
+            yield conn
@@ -0,0 +1,206 @@
+"""Dedicated worker pool for bcrypt hashing and verification.
+
+bcrypt is CPU-bound and takes tens to hundreds of milliseconds per call, so
+it runs here instead of on the event loop or in Starlette's shared
+threadpool. The pool is created from the app lifespan with
+``init_executor()`` and shut down with ``shutdown_executor()``.
+
+Configuration:
+
+    HASH_EXECUTOR   "thread" (default) or "process"
+    HASH_WORKERS    number of workers (default: CPU count)
+    BCRYPT_ROUNDS   target bcrypt cost for new hashes (default 12). Hashes
+                    with another cost still verify; ``needs_rehash()`` tells
+                    signin to replace them after a successful login.
+
+``stats()`` reports the queue depth and how long jobs waited for a worker.
+
+To pick a cost for the hardware a pod runs on, measure verify latency per
+cost factor:
+
+    cd shoppingapp/backend
+    PYTHONPATH=. python -m common.hashing --bench --rounds 10 11 12 13
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from common import metrics
+
+
+def _timed(fn, *args):
+    # Runs in the worker; the start time lets the caller measure queue wait.
+    # time.time() rather than monotonic so it is comparable across processes.
+    return time.time(), fn(*args)
+
+
+def target_rounds():
+    return int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+
+_handler_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _handler(rounds):
+    # passlib takes tens of milliseconds to import, so it is loaded on first
+    # use rather than at startup (which matters for Lambda cold starts).
+    # passlib.hash loads its handlers lazily and not thread-safely: hashing
+    # threads importing it at once get ImportError, so one loads it at a time
+    with _handler_lock:
+        from passlib.hash import bcrypt
+
+        return bcrypt.using(rounds=rounds)
+
+
+def _hash(password, rounds):
+    return _handler(rounds).hash(password)
+
+
+def _verify(password, password_hash):
+    return _handler(target_rounds()).verify(password, password_hash)
+
+
+class HashExecutor:
+    """Executor wrapper that keeps queue and wait-time counters."""
+
+    def __init__(self, kind, workers):
+        if kind == "process":
+            # spawn: forking a process that already runs an event loop and
+            # threads is not safe
+            self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+        else:
+            raise ValueError(f"HASH_EXECUTOR must be 'thread' or 'process', not {kind!r}")
+        self.kind = kind
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._in_flight += 1
+        submitted = time.time()
+        try:
+            with metrics.stage("bcrypt"):
+                started, result = await loop.run_in_executor(self._executor, _timed, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self._completed += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                "completed": self._completed,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_max": self._wait_max,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_executor = None
+
+
+def worker_count():
+    """Workers the hashing pool has, or will have once it is created."""
+    return int(os.environ.get("HASH_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def init_executor():
+    """Create the process-wide hashing pool. Safe to call more than once."""
+    global _executor
+    if _executor is None:
+        _executor = HashExecutor(
+            kind=os.environ.get("HASH_EXECUTOR", "thread").lower(),
+            workers=worker_count(),
+        )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def get_executor():
+    if _executor is None:
+        raise RuntimeError("hashing executor is not initialised; call init_executor() first")
+    return _executor
+
+
+def stats():
+    return _executor.stats() if _executor is not None else None
+
+
+metrics.register_gauges("hash_executor", stats)
+
+
+async def hash_password(password, rounds=None):
+    return await get_executor().run(_hash, password, rounds or target_rounds())
+
+
+async def verify_password(password, password_hash):
+    return await get_executor().run(_verify, password, password_hash)
+
+
+def needs_rehash(password_hash):
+    """True if ``password_hash`` was not made with the target bcrypt cost."""
+    return _handler(target_rounds()).needs_update(password_hash)
+
+
+def benchmark(rounds_list, iterations):
+    """Median and max verify latency in milliseconds for each bcrypt cost."""
+    results = {}
+    for rounds in rounds_list:
+        password_hash = _hash("benchmark-password", rounds)
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            _verify("benchmark-password", password_hash)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[rounds] = {
+            "median_ms": round(timings[len(timings) // 2], 1),
+            "max_ms": round(timings[-1], 1),
+            "verifies_per_second_per_core": round(1000 / timings[len(timings) // 2], 1),
+        }
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="bcrypt cost benchmark for this machine.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps({"cpu_count": os.cpu_count(), "verify": benchmark(args.rounds, args.iterations)}, indent=2))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,51 @@
+"""Liveness and readiness endpoints for Kubernetes probes.
+
+``/health`` answers as long as the event loop is running. ``/ready`` fails
+with 503 when the pod is saturated, so the Service stops routing logins to
+it instead of letting latency pile up:
+
+    READY_DB_TIMEOUT      seconds the DB pool gets to hand out a connection
+                          (default 1)
+    READY_MAX_HASH_QUEUE  hashing jobs allowed to wait for a worker before
+                          the pod reports not ready (default 4 per worker)
+"""
+
+import asyncio
+import os
+
+from fastapi.responses import JSONResponse
+
+from common import db, hashing
+
+
+async def health():
+    return {"status": "ok"}
+
+
+async def ready():
+    checks = {}
+
+    try:
+        async with db.connection(timeout=float(os.environ.get("READY_DB_TIMEOUT", "1"))) as conn:
+            await conn.fetchval("SELECT 1")
+        checks["database"] = "ok"
+    except (db.PoolTimeout, asyncio.TimeoutError):
+        checks["database"] = "pool saturated"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+
+    stats = hashing.stats()
+    if stats is None:
+        checks["hashing"] = "not started"
+    else:
+        limit = int(os.environ.get("READY_MAX_HASH_QUEUE", "0")) or 4 * stats["workers"]
+        checks["hashing"] = "ok" if stats["queued"] <= limit else f"queue {stats['queued']} > {limit}"
+
+    ok = all(value == "ok" for value in checks.values())
+    return JSONResponse({"status": "ok" if ok else "unavailable", "checks": checks}, status_code=200 if ok else 503)
+
+
+def install(app):
+    """Add ``/health`` and ``/ready`` to ``app``."""
+    app.add_api_route("/health", health, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/ready", ready, methods=["GET"], include_in_schema=False)
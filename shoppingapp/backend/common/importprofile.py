@@ -0,0 +1,85 @@
+"""Report what importing a service module costs, module by module.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter
+and summarises the output: total import time, time per top-level package
+(the self time of all its modules) and the slowest individual modules. Use
+it to see what a change adds to pod start-up and Lambda cold starts:
+
+    cd shoppingapp/backend
+    PYTHONPATH=. python -m common.importprofile signin
+    PYTHONPATH=. python -m common.importprofile common.lambda_handler --top 30
+    PYTHONPATH=. python -m common.importprofile signup --json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# "import time:       self [us] |  cumulative | imported package"
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def profile(module):
+    """``(name, depth, self_us, cumulative_us)`` for every module imported."""
+    path = os.pathsep.join(str(BACKEND / part) for part in ("", "signin", "signup"))
+    env = dict(os.environ, PYTHONPATH=path + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        cwd=BACKEND,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, len(indent) // 2, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def summarise(entries, top):
+    packages = {}
+    for name, _, self_us, _ in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return {
+        "total_ms": round(sum(cumulative for _, depth, _, cumulative in entries if depth == 0) / 1000, 1),
+        "modules": len(entries),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "modules_self_ms": {name: round(us / 1000, 1) for name, _, us, _ in sorted(entries, key=lambda entry: -entry[2])[:top]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of a service module.")
+    parser.add_argument("module", nargs="?", default="signin", help="module to import (default: signin)")
+    parser.add_argument("--top", type=int, default=15, help="rows per table (default 15)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = parser.parse_args()
+
+    summary = summarise(profile(args.module), args.top)
+    if args.json:
+        print(json.dumps({"module": args.module, **summary}, indent=2))
+        return
+
+    print(f"import {args.module}: {summary['total_ms']} ms, {summary['modules']} modules\n")
+    print("packages, ms")
+    for name, ms in summary["packages_ms"].items():
+        print(f"  {ms:>8}  {name}")
+    print("\nmodules, self ms")
+    for name, ms in summary["modules_self_ms"].items():
+        print(f"  {ms:>8}  {name}")
+
+
+if __name__ == "__main__":
+    main()
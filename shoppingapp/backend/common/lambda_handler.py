@@ -0,0 +1,71 @@
+"""AWS Lambda entry point for the auth services.
+
+Set the function handler to ``common.lambda_handler.handler``. It serves
+the routes of ``AUTH_SERVICES`` (default: signin and signup) behind API
+Gateway or a function URL, through mangum.
+
+Importing this module loads nothing but the standard library; FastAPI,
+mangum and the app are imported on the first invocation. The app's startup
+(connection pool, hashing pool, caches) also runs once, on that first
+invocation, and is kept for every warm invocation after it: mangum's own
+lifespan support would run startup and shutdown around every request, so
+it is turned off and the lifespan is entered here instead, on the event
+loop that mangum reuses.
+
+A Lambda instance handles one request at a time, so the defaults are sized
+for that (each can be overridden through the environment):
+
+    DB_POOL_MIN_SIZE=1, DB_POOL_MAX_SIZE=2, HASH_WORKERS=1,
+    DB_MIGRATE_ON_STARTUP=false    run migrations as a deploy step instead
+    USERNAME_CACHE=off             no LISTEN connection per instance
+
+Serving signin requires ``TOKEN_SECRET``: every instance is a separate
+process, and without it each would sign tokens with its own random key.
+
+To measure cold starts locally:
+
+    cd shoppingapp/backend && PYTHONPATH=. python bench/lambda_coldstart.py
+"""
+
+import asyncio
+import os
+
+LAMBDA_DEFAULTS = {
+    "DB_POOL_MIN_SIZE": "1",
+    "DB_POOL_MAX_SIZE": "2",
+    "HASH_EXECUTOR": "thread",
+    "HASH_WORKERS": "1",
+    "DB_MIGRATE_ON_STARTUP": "false",
+    "USERNAME_CACHE": "off",
+}
+
+_adapter = None
+
+
+def _init():
+    global _adapter
+    for key, value in LAMBDA_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+
+    from mangum import Mangum
+
+    from common.app import create_app, services_from_env
+
+    services = services_from_env("signin,signup")
+    if "signin" in services and not os.environ.get("TOKEN_SECRET"):
+        raise RuntimeError("TOKEN_SECRET must be set to serve signin on Lambda")
+    app = create_app(services)
+
+    # mangum runs each request on asyncio.get_event_loop(); start the app on
+    # that same loop so the pool's connections stay usable
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(app.router.lifespan_context(app).__aenter__())
+
+    _adapter = Mangum(app, lifespan="off")
+
+
+def handler(event, context):
+    if _adapter is None:
+        _init()
+    return _adapter(event, context)
@@ -0,0 +1,136 @@
+"""Prometheus metrics shared by the auth services.
+
+``install(app)`` adds a ``/metrics`` route and a middleware that counts
+requests and records their latency per route, method and status. Inside a
+request, ``stage("db_query")`` times one step of the work, so a login can
+be broken down into:
+
+    db_connect      waiting for a pooled connection
+    db_query        running SQL
+    bcrypt          hashing or verifying, including queueing for a worker
+    serialization   rendering the JSON response
+
+Modules with internal state (pools, executors, caches) publish it as gauges
+with ``register_gauges(name, stats_fn)``. ``stats_fn`` returns a dict (or
+None) and is read at scrape time; each numeric value becomes an
+``auth_<name>_<key>`` gauge.
+
+Under a multi-worker server (``common.server``) ``PROMETHEUS_MULTIPROC_DIR``
+is set, and the request counters and histograms are summed across workers.
+The gauges always describe the worker that answered the scrape.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from starlette.responses import Response
+
+REQUESTS = Counter("auth_requests_total", "HTTP requests handled", ["route", "method", "status"])
+REQUEST_LATENCY = Histogram(
+    "auth_request_duration_seconds",
+    "HTTP request latency",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STAGE_LATENCY = Histogram(
+    "auth_stage_duration_seconds",
+    "Time spent in each stage of a request",
+    ["route", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+_route = ContextVar("metrics_route", default="background")
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(_route.get(), name).observe(time.perf_counter() - started)
+
+
+class _StatsCollector:
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name, stats_fn):
+        self._sources[name] = stats_fn
+
+    def collect(self):
+        for name, stats_fn in self._sources.items():
+            stats = stats_fn()
+            if not stats:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    yield GaugeMetricFamily(f"auth_{name}_{key}", f"{name} {key}", value=float(value))
+
+
+_collector = _StatsCollector()
+REGISTRY.register(_collector)
+
+
+def register_gauges(name, stats_fn):
+    _collector.register(name, stats_fn)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts and latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        token = _route.set(scope["path"])
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up
+            # the label cardinality
+            path = route.path if route is not None else "unmatched"
+            labels = (path, scope["method"], str(status))
+            REQUESTS.labels(*labels).inc()
+            REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+            _route.reset(token)
+
+
+def _scrape_registry():
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_collector)
+    return registry
+
+
+async def metrics_endpoint():
+    return Response(generate_latest(_scrape_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+def install(app):
+    """Add the metrics middleware and the ``/metrics`` route to ``app``."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,260 @@
+"""Versioned schema migrations for the ``users`` table.
+
+Both services run ``migrate()`` from their lifespan (unless
+``DB_MIGRATE_ON_STARTUP`` is false), and it can be run by hand:
+
+    cd shoppingapp/backend
+    PYTHONPATH=. python -m common.migrations            # apply pending
+    PYTHONPATH=. python -m common.migrations --list     # show status
+    PYTHONPATH=. python -m common.migrations --enable covering_username
+    PYTHONPATH=. python -m common.migrations --enable ci_username
+
+Applied versions are recorded in ``schema_migrations``. A session-level
+advisory lock serialises pods that start at the same time. It is polled
+with ``pg_try_advisory_lock`` rather than waited on, because a session
+blocked in ``pg_advisory_lock`` keeps a transaction open, and a
+``CREATE INDEX CONCURRENTLY`` run by the lock holder would wait for it:
+a deadlock. Regular
+migrations run in their own transaction; ``concurrent`` ones hold a single
+``CREATE INDEX CONCURRENTLY`` statement and run outside a transaction so
+that building an index on a large, live table does not block signups.
+
+A ``CREATE INDEX CONCURRENTLY`` that fails leaves an INVALID index behind,
+which ``IF NOT EXISTS`` would then count as built. For migrations that name
+their ``index``, such a leftover is dropped when the build fails and again
+before the next attempt, so a retry really rebuilds it. A migration's
+``check`` query runs first; any rows it returns (such as duplicate
+usernames for the unique index) stop the migration with a
+``MigrationError`` listing them, to be fixed by hand.
+
+Migrations with a ``flag`` are optional and only run when the flag is
+listed in ``DB_MIGRATION_FLAGS`` (comma separated) or passed with
+``--enable``. Skipped optional migrations are not recorded, so they can be
+enabled later. They are:
+
+    covering_username   an index-only lookup index for signin
+    ci_username         usernames unique regardless of case, so "Alice"
+                        cannot sign up next to "alice"; existing names that
+                        differ only in case block it until fixed by hand
+"""
+
+import argparse
+import asyncio
+import os
+from typing import NamedTuple, Optional
+
+from common import db
+
+
+class MigrationError(Exception):
+    """A migration cannot run until the database is fixed by hand."""
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    sql: str
+    concurrent: bool = False
+    flag: Optional[str] = None
+    # Index a concurrent migration builds, checked for INVALID leftovers
+    index: Optional[str] = None
+    # Rows this query returns block the migration
+    check: Optional[str] = None
+
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "users table",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(255) NOT NULL
+        );
+        """,
+    ),
+    Migration(
+        2,
+        "case-insensitive unique usernames",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_username_lower_key ON users (lower(username))",
+        concurrent=True,
+        flag="ci_username",
+        index="users_username_lower_key",
+        check=(
+            "SELECT lower(username) AS username, count(*) AS rows FROM users "
+            "GROUP BY lower(username) HAVING count(*) > 1 LIMIT 20"
+        ),
+    ),
+    Migration(
+        3,
+        "covering username index for index-only signin lookups",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_username_hash_idx ON users (username) INCLUDE (password_hash)",
+        concurrent=True,
+        flag="covering_username",
+        index="users_username_hash_idx",
+    ),
+    Migration(
+        4,
+        "notify users_added on insert, for the in-process username caches",
+        """
+        CREATE OR REPLACE FUNCTION notify_users_added() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('users_added', NEW.username);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS users_added_notify ON users;
+        CREATE TRIGGER users_added_notify AFTER INSERT ON users
+            FOR EACH ROW EXECUTE FUNCTION notify_users_added();
+        """,
+    ),
+    Migration(
+        5,
+        "revoked_tokens, polled by the in-process revocation index",
+        """
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            jti TEXT PRIMARY KEY,
+            expires_at TIMESTAMPTZ NOT NULL,
+            revoked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS revoked_tokens_revoked_at_idx ON revoked_tokens (revoked_at);
+        """,
+    ),
+    Migration(
+        6,
+        "unique username index, which signup's ON CONFLICT relies on",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_username_key ON users (username)",
+        concurrent=True,
+        index="users_username_key",
+        check="SELECT username, count(*) AS rows FROM users GROUP BY username HAVING count(*) > 1 LIMIT 20",
+    ),
+]
+
+# Arbitrary key for pg_advisory_lock, shared by every service
+_LOCK_KEY = 0x5E55_0001
+
+# Seconds between attempts to take the lock
+_LOCK_POLL = 0.5
+
+
+def enabled_flags():
+    return {flag.strip() for flag in os.environ.get("DB_MIGRATION_FLAGS", "").split(",") if flag.strip()}
+
+
+def migrate_on_startup():
+    return os.environ.get("DB_MIGRATE_ON_STARTUP", "true").lower() not in ("0", "false", "no")
+
+
+async def _ensure_table(conn):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+async def _applied_versions(conn):
+    return {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+
+async def migrate(flags=None):
+    """Apply every pending migration and return the versions applied."""
+    flags = enabled_flags() if flags is None else set(flags)
+    applied = []
+    async with db.connection() as conn:
+        while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+            await asyncio.sleep(_LOCK_POLL)
+        try:
+            await _ensure_table(conn)
+            done = await _applied_versions(conn)
+            for migration in MIGRATIONS:
+                if migration.version in done or (migration.flag and migration.flag not in flags):
+                    continue
+                if migration.check:
+                    await _check(conn, migration)
+                if migration.concurrent:
+                    await _run_concurrently(conn, migration)
+                    await _record(conn, migration)
+                else:
+                    async with conn.transaction():
+                        await conn.execute(migration.sql)
+                        await _record(conn, migration)
+                applied.append(migration.version)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+    return applied
+
+
+async def _check(conn, migration):
+    rows = await conn.fetch(migration.check)
+    if rows:
+        found = "; ".join(" ".join(f"{key}={value}" for key, value in row.items()) for row in rows)
+        raise MigrationError(f"migration {migration.version} ({migration.description}) is blocked by: {found}")
+
+
+async def _index_valid(conn, name):
+    """True or False for an existing index, None if there is none."""
+    return await conn.fetchval("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1::text)", name)
+
+
+async def _drop_invalid(conn, name):
+    if await _index_valid(conn, name) is False:
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+async def _run_concurrently(conn, migration):
+    if migration.index:
+        await _drop_invalid(conn, migration.index)
+    try:
+        await conn.execute(migration.sql)
+    except Exception:
+        if migration.index:
+            await _drop_invalid(conn, migration.index)
+        raise
+
+
+async def _record(conn, migration):
+    await conn.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)",
+        migration.version,
+        migration.description,
+    )
+
+
+async def status():
+    """Return ``(migration, applied)`` pairs for every known migration."""
+    async with db.connection() as conn:
+        await _ensure_table(conn)
+        done = await _applied_versions(conn)
+    return [(migration, migration.version in done) for migration in MIGRATIONS]
+
+
+async def _main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations for the auth services.")
+    parser.add_argument("--list", action="store_true", help="show migration status and exit")
+    parser.add_argument("--enable", action="append", default=[], metavar="FLAG", help="also apply an optional migration")
+    args = parser.parse_args()
+
+    load_dotenv()
+    await db.init_pool()
+    try:
+        if args.list:
+            for migration, applied in await status():
+                optional = f" [{migration.flag}]" if migration.flag else ""
+                print(f"{migration.version:>4}  {'applied' if applied else 'pending':<8} {migration.description}{optional}")
+        else:
+            applied = await migrate(enabled_flags() | set(args.enable))
+            print(f"applied: {', '.join(map(str, applied)) or 'nothing to do'}")
+    finally:
+        await db.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,285 @@
+"""Per-IP and per-username rate limiting with token buckets.
+
+Every signin attempt against a real account costs a bcrypt verify, so
+abusive traffic is rejected here, before the request reaches admission
+control, the database or the hashing pool. Each key (``ip:<addr>`` or
+``user:<name>``) owns a token bucket that refills at ``RATE`` tokens per
+second up to ``BURST``; a request that finds its bucket empty gets 429 with
+``Retry-After``.
+
+Every request to a limited path takes a token from its IP's bucket and,
+for signin, from its username's bucket, before the password is checked, so
+concurrent guesses cannot all get past an almost empty bucket. A signin
+that succeeds gives its username token back (``refund``), so in effect
+only failures are charged: a user who knows their password is never locked
+out by their own logins, and nobody else can exhaust the bucket with
+requests that succeed.
+
+Configuration:
+
+    RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST       per client IP
+                                                  (default 10/s, burst 30)
+    RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST   failed signins per username
+                                                  (default 0.1/s, burst 10)
+    RATE_LIMIT_MAX_KEYS     keys held by the in-memory store (default 100000)
+    RATE_LIMIT_TRUST_FORWARDED
+                            take the client IP from X-Forwarded-For
+                            (default false); required behind an ingress or
+                            load balancer, where every request otherwise
+                            comes from the proxy's IP and shares one bucket
+    RATE_LIMIT_PROXY_HOPS   trusted proxies in front of the service, each
+                            appending one X-Forwarded-For entry (default 1);
+                            the client IP is the entry that many from the
+                            end, so entries a client sends itself are ignored
+    RATE_LIMIT_BACKEND      "memory" (default) or "package.module:Class"
+
+A rate of 0 disables that limit. The in-memory store is per process; to
+share buckets across pods, point ``RATE_LIMIT_BACKEND`` at a class with
+the same ``take()`` and ``refund()`` coroutines as ``MemoryStore`` (for
+example one backed by Redis), constructed with no arguments.
+"""
+
+import importlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from common import metrics, responses
+
+
+_TOO_MANY = responses.constant({"detail": "Too many requests"}, 429)
+
+
+class Limit(NamedTuple):
+    rate: float
+    burst: float
+
+
+class MemoryStore:
+    """Bounded in-process token bucket store.
+
+    Buckets live in an LRU-ordered dict of ``key -> (tokens, updated,
+    full_at)``. The least recently used key is dropped when ``max_keys`` is
+    reached, and buckets that have refilled completely are swept as they
+    reach the old end, since a full bucket is the same as no bucket.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+        self._buckets = OrderedDict()
+        self.evictions = 0
+
+    def _tokens(self, key, limit, now):
+        tokens, updated, _ = self._buckets.get(key, (limit.burst, now, now))
+        return min(limit.burst, tokens + (now - updated) * limit.rate)
+
+    def _put(self, key, limit, tokens, now):
+        self._buckets.pop(key, None)
+        self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+        self._sweep(now)
+
+    async def peek(self, key, limit):
+        """0 if a token is free, else seconds until one is.
+
+        A read only: the bucket is neither created nor moved in LRU order.
+        """
+        tokens = self._tokens(key, limit, time.monotonic())
+        return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+    async def take(self, key, limit):
+        """Take one token; return 0 if allowed, else seconds until one is free."""
+        now = time.monotonic()
+        tokens = self._tokens(key, limit, now)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / limit.rate
+        self._put(key, limit, tokens, now)
+        return wait
+
+    async def refund(self, key, limit):
+        """Give back a token taken by ``take()``."""
+        if key not in self._buckets:
+            # Swept or evicted, so already as good as full
+            return
+        now = time.monotonic()
+        self._put(key, limit, min(limit.burst, self._tokens(key, limit, now) + 1), now)
+
+    def _sweep(self, now):
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        for _ in range(2):
+            oldest = next(iter(self._buckets.items()), None)
+            if oldest is None or oldest[1][2] > now:
+                break
+            del self._buckets[oldest[0]]
+
+    def stats(self):
+        return {"keys": len(self._buckets), "evictions": self.evictions}
+
+
+def _load_backend():
+    name = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    if name == "memory":
+        return MemoryStore()
+    module, _, cls = name.partition(":")
+    return getattr(importlib.import_module(module), cls)()
+
+
+def _limit(prefix, rate, burst):
+    return Limit(
+        float(os.environ.get(f"RATE_LIMIT_{prefix}_RATE", rate)),
+        float(os.environ.get(f"RATE_LIMIT_{prefix}_BURST", burst)),
+    )
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+        self.ip_limit = _limit("IP", 10, 30)
+        self.user_limit = _limit("USER", 0.1, 10)
+        self.trust_forwarded = os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+        self.proxy_hops = max(1, int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "1")))
+        self.rejected = {"ip": 0, "user": 0}
+
+    def client_ip(self, scope):
+        if self.trust_forwarded:
+            hops = [
+                hop.strip()
+                for name, value in scope["headers"]
+                if name == b"x-forwarded-for"
+                for hop in value.decode("latin-1").split(",")
+                if hop.strip()
+            ]
+            if hops:
+                return hops[-min(self.proxy_hops, len(hops))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def check(self, kind, key):
+        """Take a token for ``key``; seconds to wait before it may try again, or 0."""
+        limit = self.ip_limit if kind == "ip" else self.user_limit
+        if limit.rate <= 0:
+            return 0.0
+        wait = await self.store.take(f"{kind}:{key}", limit)
+        if wait:
+            self.rejected[kind] += 1
+        return wait
+
+    async def refund(self, username):
+        if self.user_limit.rate > 0:
+            await self.store.refund(f"user:{username}", self.user_limit)
+
+    def stats(self):
+        stats = {f"rejected_{kind}": count for kind, count in self.rejected.items()}
+        if hasattr(self.store, "stats"):
+            stats.update(self.store.stats())
+        return stats
+
+
+_limiter = None
+
+
+def get_limiter():
+    """The process-wide limiter, shared by every app in the process."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(_load_backend())
+    return _limiter
+
+
+def stats():
+    return _limiter.stats() if _limiter is not None else None
+
+
+async def refund(username):
+    """Give a successful signin's token back to ``username``'s bucket."""
+    await get_limiter().refund(username)
+
+
+metrics.register_gauges("rate_limit", stats)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware enforcing the limits on the configured paths.
+
+    ``routes`` maps a path to the keys it is limited by: ``"ip"`` and/or
+    ``"username"``. The username is read from the JSON body, which is then
+    replayed unchanged to the app.
+    """
+
+    def __init__(self, app, limiter, routes):
+        self.app = app
+        self.limiter = limiter
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        # CORS preflights cost nothing and never use up tokens
+        limited = scope["type"] == "http" and scope["method"] != "OPTIONS"
+        keys = self.routes.get(scope["path"]) if limited else None
+        if not keys:
+            await self.app(scope, receive, send)
+            return
+
+        if "ip" in keys:
+            wait = await self.limiter.check("ip", self.limiter.client_ip(scope))
+            if wait:
+                await self._reject(scope, send, wait)
+                return
+
+        if "username" in keys:
+            messages, body = await self._read_body(receive)
+            username = self._username(body)
+            if username is not None:
+                wait = await self.limiter.check("user", username)
+                if wait:
+                    await self._reject(scope, send, wait)
+                    return
+            receive = self._replay(messages, receive)
+
+        await self.app(scope, receive, send)
+
+    async def _read_body(self, receive):
+        messages, chunks = [], []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return messages, b"".join(chunks)
+
+    @staticmethod
+    def _username(body):
+        try:
+            username = json.loads(body).get("username")
+        except (ValueError, AttributeError):
+            return None
+        return username if isinstance(username, str) else None
+
+    @staticmethod
+    def _replay(messages, receive):
+        pending = list(messages)
+
+        async def replay():
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        return replay
+
+    async def _reject(self, scope, send, wait):
+        response = _TOO_MANY()
+        response.raw_headers.append((b"retry-after", str(max(1, int(wait + 0.999))).encode()))
+        await response(scope, None, send)
+
+
+def install(app, routes):
+    """Rate limit ``routes`` (``{path: ("ip", "username")}``) on ``app``."""
+    app.add_middleware(RateLimitMiddleware, limiter=get_limiter(), routes=routes)
@@ -0,0 +1,104 @@
+"""JSON responses for the auth routes, without FastAPI's generic encoding path.
+
+A handler that returns a dict has it walked by ``jsonable_encoder`` and then
+encoded by ``json.dumps``, which is most of the per-request CPU time outside
+bcrypt and the database. The auth routes only ever return flat dicts of
+strings and numbers, so they use:
+
+    constant(content)   a response whose body is encoded once, at import,
+                        for fixed messages such as "Sign-in successful!"
+    json(content)       a response for a dynamic dict, encoded directly
+                        with the fastest encoder available
+
+Error responses raised as ``HTTPException`` go through ``install(app)``'s
+handler, which encodes each distinct ``(status, detail)`` body once.
+
+Configuration:
+
+    JSON_ENCODER    "auto" (default: orjson if it is installed, else the
+                    standard library), "orjson" or "json"
+"""
+
+import functools
+import json as _json
+import os
+
+from fastapi import HTTPException
+from fastapi.exception_handlers import http_exception_handler as _default_http_exception_handler
+from fastapi.responses import JSONResponse
+from fastapi.utils import is_body_allowed_for_status_code
+from starlette.responses import Response
+
+from common import metrics
+
+
+def _stdlib_dumps(content):
+    # Same output as Starlette's JSONResponse
+    return _json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _select_encoder():
+    name = os.environ.get("JSON_ENCODER", "auto").lower()
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+
+            return "orjson", orjson.dumps
+        except ImportError:
+            if name == "orjson":
+                raise
+    return "json", _stdlib_dumps
+
+
+ENCODER, dumps = _select_encoder()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with ``dumps``, timed as the serialization stage."""
+
+    def render(self, content):
+        with metrics.stage("serialization"):
+            return dumps(content)
+
+
+class _ConstantResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, body, status_code, raw_headers):
+        self.body = body
+        self.status_code = status_code
+        self.background = None
+        # Middleware (CORS) appends to the headers of a response, so each
+        # response gets its own copy of the list
+        self.raw_headers = list(raw_headers)
+
+
+def constant(content, status_code=200):
+    """A factory of responses with ``content`` encoded once, up front."""
+    template = Response(dumps(content), status_code=status_code, media_type="application/json")
+    body, raw_headers = template.body, template.raw_headers
+    return lambda: _ConstantResponse(body, status_code, raw_headers)
+
+
+def json(content, status_code=200):
+    """A response for ``content``, skipping ``jsonable_encoder``."""
+    return FastJSONResponse(content, status_code=status_code)
+
+
+@functools.lru_cache(maxsize=256)
+def _error(status_code, detail):
+    return constant({"detail": detail}, status_code)
+
+
+async def http_exception_handler(request, exc):
+    if not isinstance(exc.detail, str) or not is_body_allowed_for_status_code(exc.status_code):
+        return await _default_http_exception_handler(request, exc)
+    response = _error(exc.status_code, exc.detail)()
+    for name, value in (exc.headers or {}).items():
+        response.raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    return response
+
+
+def install(app):
+    """Use the cached error bodies for ``HTTPException`` on ``app``."""
+    app.add_exception_handler(HTTPException, http_exception_handler)
@@ -0,0 +1,166 @@
+"""In-process index of revoked tokens, and the verifier that consults it.
+
+Tokens from ``common.tokens`` are valid until they expire. Signing out
+revokes one early by inserting its ``jti`` into the ``revoked_tokens``
+table. Every process that verifies tokens keeps the unexpired part of that
+table in memory, so ``verify()`` is a signature check (usually a cache hit
+in ``common.tokens``) plus a set lookup, with no database work on the
+request path.
+
+The index is loaded in full at startup and then polled for rows revoked
+since the last poll. Rows are stamped with their transaction's start time,
+and a transaction can commit after a newer one, so every poll reaches back
+``REVOCATION_OVERLAP`` seconds; reading a row twice is harmless. A
+revocation therefore takes effect in every process within about one
+refresh interval. Entries are dropped from memory, and rows from the
+table, once the token they name has expired anyway.
+
+Configuration:
+
+    REVOCATION_REFRESH    seconds between polls (default 5)
+    REVOCATION_OVERLAP    seconds each poll re-reads (default 30)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+
+from common import db, metrics, tokens
+
+logger = logging.getLogger(__name__)
+
+# Expired rows are deleted from the table at most this often
+PURGE_INTERVAL = 3600
+
+LOAD_REVOKED = """
+    SELECT jti, extract(epoch FROM expires_at)::float8 AS exp, revoked_at
+    FROM revoked_tokens
+    WHERE expires_at > now() AND revoked_at > coalesce($1::timestamptz, '-infinity')
+"""
+
+
+class RevocationIndex:
+    def __init__(self, refresh, overlap):
+        self.refresh = refresh
+        self.overlap = timedelta(seconds=overlap)
+        # jti -> exp (unix time) of every revoked, unexpired token
+        self._revoked = {}
+        self._newest = None
+        self._pruned = self._purged = time.time()
+        self.loaded_at = None
+        self._task = None
+
+    def is_revoked(self, jti):
+        return jti in self._revoked
+
+    def add(self, jti, expires):
+        self._revoked[jti] = expires
+
+    async def load(self):
+        """Read the rows revoked since the last load (every row the first time)."""
+        started = time.time()
+        since = self._newest - self.overlap if self._newest is not None else None
+        async with db.connection() as conn:
+            with metrics.stage("db_query"):
+                rows = await conn.fetch(LOAD_REVOKED, since)
+        for jti, exp, revoked_at in rows:
+            self._revoked[jti] = exp
+            if self._newest is None or revoked_at > self._newest:
+                self._newest = revoked_at
+        self.loaded_at = started
+
+        if started - self._pruned > self.refresh * 12:
+            self._pruned = started
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > started}
+
+    async def purge(self):
+        """Delete rows whose tokens have expired."""
+        async with db.connection() as conn:
+            await conn.execute("DELETE FROM revoked_tokens WHERE expires_at < now()")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh)
+            try:
+                await self.load()
+                if time.time() - self._purged > PURGE_INTERVAL:
+                    self._purged = time.time()
+                    await self.purge()
+            except Exception:
+                logger.exception("revocation index refresh failed")
+
+    async def start(self):
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {
+            "entries": len(self._revoked),
+            "staleness_seconds": time.time() - self.loaded_at if self.loaded_at else 0,
+        }
+
+
+_index = None
+
+
+async def start_index():
+    """Load the index and start polling for new revocations."""
+    global _index
+    if _index is None:
+        _index = RevocationIndex(
+            refresh=float(os.environ.get("REVOCATION_REFRESH", "5")),
+            overlap=float(os.environ.get("REVOCATION_OVERLAP", "30")),
+        )
+        await _index.start()
+    return _index
+
+
+async def stop_index():
+    global _index
+    if _index is not None:
+        await _index.stop()
+        _index = None
+
+
+def stats():
+    return _index.stats() if _index is not None else None
+
+
+metrics.register_gauges("revocation", stats)
+
+
+def verify(token, token_type="access"):
+    """Claims of a valid, unrevoked token; raises ``tokens.TokenError``.
+
+    Without a started index (``start_index()``) revocations are not seen.
+    """
+    claims = tokens.verify(token, token_type)
+    # Tokens are revoked by jti, and the routes read sub; a signed token
+    # missing either (say, from another tool holding the key) is refused
+    # rather than failing later with a KeyError
+    for claim in ("jti", "sub"):
+        if not isinstance(claims.get(claim), str) or not claims[claim]:
+            raise tokens.TokenError(f"token has no {claim}")
+    if _index is not None and _index.is_revoked(claims["jti"]):
+        raise tokens.TokenError("token revoked")
+    return claims
+
+
+async def revoke(claims):
+    """Revoke the token with these claims, here at once and elsewhere on their next poll."""
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            await conn.execute(
+                "INSERT INTO revoked_tokens (jti, expires_at) VALUES ($1, to_timestamp($2)) ON CONFLICT (jti) DO NOTHING",
+                claims["jti"],
+                claims["exp"],
+            )
+    if _index is not None:
+        _index.add(claims["jti"], claims["exp"])
@@ -0,0 +1,10 @@
+"""Route handlers for the auth services, one ``APIRouter`` per service.
+
+Each module also declares how its routes are guarded:
+
+    ADMISSION     ``{path: admission.Route}`` for ``admission.install``
+    RATE_LIMITS   ``{path: keys}`` for ``ratelimit.install``
+    BODY_LIMITS   ``{path: bytes}`` for ``validation.install``
+
+``common.app.create_app()`` mounts any combination of them on one app.
+"""
@@ -0,0 +1,181 @@
+import logging
+import os
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Request
+from pydantic import BaseModel, StringConstraints
+
+from common import admission, bulk, credcache, db, hashing, metrics, ratelimit, responses, revocation, tokens, usernames
+from common.validation import Password, Username
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Bounded concurrency and queueing, per hashing worker; signin outranks
+# signup when both share a process. Bulk verification runs one job at a
+# time, outside the global cap, so a long upload never holds interactive
+# signins' slots
+ADMISSION = {
+    "/signin": admission.Route(priority=0, concurrency=2, queue=4),
+    "/signin/bulk": admission.Route(priority=2, concurrency=1, queue=0, scaled=False, shared=False),
+}
+
+# Per-IP and per-username token buckets; abusive clients get 429 before any DB
+# or hash work. A successful signin gets its username token back, so only
+# failures use up the username's bucket.
+RATE_LIMITS = {"/signin": ("ip", "username"), "/refresh": ("ip",)}
+
+# Bulk verification streams its body, so it may be far larger than a signin
+BODY_LIMITS = {"/signin/bulk": int(os.environ.get("BULK_MAX_BODY_BYTES", str(1 << 30)))}
+
+
+SIGNOUT_OK = responses.constant({"message": "Signed out"})
+
+
+# Schema for signin data
+class SigninData(BaseModel):
+    username: Username
+    password: Password
+
+
+class RefreshData(BaseModel):
+    refresh_token: Annotated[str, StringConstraints(max_length=2048)]
+
+
+class SignoutData(BaseModel):
+    refresh_token: Optional[Annotated[str, StringConstraints(max_length=2048)]] = None
+
+
+# Only the column signin needs. asyncpg keeps a per-connection cache of
+# server-side prepared statements, so on a pooled connection this is parsed
+# and planned once and then only bound and executed.
+FETCH_PASSWORD_HASH = "SELECT password_hash FROM users WHERE username = $1"
+
+
+async def fetch_password_hash(username: str):
+    # Borrow a pooled connection; it goes back to the pool on exit
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            return await conn.fetchval(FETCH_PASSWORD_HASH, username)
+
+
+async def rehash_password(username: str, password: str, old_hash: str):
+    """Re-hash a just-verified password at the target bcrypt cost.
+
+    Runs after the response is sent. The UPDATE only applies if the stored
+    hash is still the one that was verified, so a concurrent password change
+    is never overwritten.
+    """
+    try:
+        new_hash = await hashing.hash_password(password)
+        async with db.connection() as conn:
+            with metrics.stage("db_query"):
+                updated = await conn.fetchval(
+                    "UPDATE users SET password_hash = $1 WHERE username = $2 AND password_hash = $3 RETURNING true",
+                    new_hash,
+                    username,
+                    old_hash,
+                )
+        if updated:
+            credcache.remember(username, password, new_hash)
+    except Exception:
+        logger.exception("rehash for %s failed", username)
+
+
+@router.post("/signin")
+async def signin(user: SigninData, background_tasks: BackgroundTasks):
+    try:
+        # Usernames the cache knows are absent never reach the database
+        if not usernames.might_exist(user.username):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        # DB I/O on the event loop, bcrypt in the hashing pool
+        password_hash = await fetch_password_hash(user.username)
+        if not password_hash:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        # A retry of a login verified seconds ago skips bcrypt
+        if not credcache.check(user.username, user.password, password_hash):
+            if not await hashing.verify_password(user.password, password_hash):
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            credcache.remember(user.username, user.password, password_hash)
+
+            # Bring hashes made with another bcrypt cost up to BCRYPT_ROUNDS
+            if hashing.needs_rehash(password_hash):
+                background_tasks.add_task(rehash_password, user.username, user.password, password_hash)
+
+        # Only failed attempts count against the username's rate limit
+        await ratelimit.refund(user.username)
+
+        # Signed access/refresh tokens, so later requests are checked with an
+        # HMAC instead of another bcrypt verify
+        return responses.json({"message": "Sign-in successful!", **tokens.issue_pair(user.username)})
+    except HTTPException:
+        raise
+    except db.PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def bearer_claims(authorization: Optional[str]):
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return revocation.verify(token.strip())
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.post("/refresh")
+async def refresh(data: RefreshData):
+    try:
+        claims = revocation.verify(data.refresh_token, "refresh")
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    return responses.json(tokens.issue_access(claims["sub"]))
+
+
+# For gateways and other services: 200 with the subject for a valid,
+# unrevoked access token, 401 otherwise. No database work per call.
+@router.get("/verify")
+async def verify(authorization: Optional[str] = Header(None)):
+    claims = bearer_claims(authorization)
+    return responses.json({"sub": claims["sub"], "exp": claims["exp"]})
+
+
+@router.post("/signout")
+async def signout(data: Optional[SignoutData] = None, authorization: Optional[str] = Header(None)):
+    claims = bearer_claims(authorization)
+    try:
+        await revocation.revoke(claims)
+        if data is not None and data.refresh_token:
+            try:
+                refresh_claims = revocation.verify(data.refresh_token, "refresh")
+            except tokens.TokenError:
+                refresh_claims = None
+            if refresh_claims is not None and refresh_claims["sub"] == claims["sub"]:
+                await revocation.revoke(refresh_claims)
+        return SIGNOUT_OK()
+    except db.PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# For migration checks and password audits: one result per username/password
+# row, streamed back as NDJSON. See common/bulk.py.
+@router.post("/signin/bulk")
+async def signin_bulk(request: Request, format: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    allowed = bulk.check_token(authorization, "BULK_VERIFY_TOKEN")
+    if allowed is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not allowed:
+        raise HTTPException(status_code=401, detail="Invalid bulk verify token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        fmt = bulk.detect_format(format, request.headers.get("content-type"))
+    except bulk.BulkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bulk.ResultsResponse(bulk.run_verify(request.stream(), fmt))
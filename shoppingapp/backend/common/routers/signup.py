@@ -0,0 +1,99 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from pydantic import BaseModel
+
+from common import admission, bulk, db, hashing, metrics, responses, usernames
+from common.validation import NewPassword, NewUsername
+
+router = APIRouter()
+
+# Bounded concurrency and queueing, per hashing worker; signin outranks
+# signup when both share a process. Bulk imports run one at a time,
+# outside the global cap, so a long upload never holds interactive slots
+ADMISSION = {
+    "/signup": admission.Route(priority=1, concurrency=1, queue=2),
+    "/signup/bulk": admission.Route(priority=2, concurrency=1, queue=0, scaled=False, shared=False),
+}
+
+# Per-IP token buckets; abusive clients get 429 before any DB or hash work
+RATE_LIMITS = {"/signup": ("ip",)}
+
+# Bulk imports stream their body, so it may be far larger than a signup
+BODY_LIMITS = {"/signup/bulk": int(os.environ.get("BULK_MAX_BODY_BYTES", str(1 << 30)))}
+
+
+SIGNUP_OK = responses.constant({"message": "User registered successfully!"})
+
+
+# Schema for signup data
+class SignupData(BaseModel):
+    username: NewUsername
+    password: NewPassword
+
+
+async def username_taken(username: str) -> bool:
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            return bool(await conn.fetchval("SELECT true FROM users WHERE username = $1", username))
+
+
+async def insert_user(username: str, hashed_password: str) -> bool:
+    """Insert the user in one atomic statement.
+
+    Returns False when the username is already taken. The unique index on
+    ``username`` makes this safe against concurrent signups for the same name;
+    no conflict target is named, so with the optional case-insensitive index
+    (``ci_username``) a name differing only in case counts as taken too.
+    """
+    async with db.connection() as conn:
+        with metrics.stage("db_query"):
+            inserted = await conn.fetchval(
+                "INSERT INTO users (username, password_hash) VALUES ($1, $2) ON CONFLICT DO NOTHING RETURNING true",
+                username,
+                hashed_password,
+            )
+    return bool(inserted)
+
+
+@router.post("/signup")
+async def signup(user: SignupData):
+    try:
+        # Turn away usernames the username cache says are taken before paying
+        # for a bcrypt hash. Everything else goes straight to the insert,
+        # which catches taken names in the same round trip.
+        if usernames.probably_exists(user.username) and await username_taken(user.username):
+            raise HTTPException(status_code=400, detail="Username already exists")
+
+        # Hash the password in the dedicated hashing pool
+        hashed_password = await hashing.hash_password(user.password)
+
+        # Insert new user into the database, unless the username is taken
+        if not await insert_user(user.username, hashed_password):
+            raise HTTPException(status_code=400, detail="Username already exists")
+
+        # Other processes learn about the new user from the users_added trigger
+        usernames.add(user.username)
+
+        return SIGNUP_OK()
+    except HTTPException:
+        raise
+    except db.PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/signup/bulk")
+async def signup_bulk(request: Request, format: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    allowed = bulk.check_token(authorization, "BULK_IMPORT_TOKEN")
+    if allowed is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not allowed:
+        raise HTTPException(status_code=401, detail="Invalid bulk import token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        fmt = bulk.detect_format(format, request.headers.get("content-type"))
+    except bulk.BulkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bulk.ResultsResponse(bulk.run_import(request.stream(), fmt))
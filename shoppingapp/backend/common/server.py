@@ -0,0 +1,132 @@
+"""Production server for the auth services: gunicorn with uvicorn workers.
+
+    cd shoppingapp/backend
+    PYTHONPATH=. python -m common.server --services signin --port 8000
+
+One uvicorn worker only ever uses one core for the event loop, so this runs
+several of them, sized from the CPU the container may actually use (its
+cgroup quota, not the host's core count). The app is imported once in the
+master before forking (``preload_app``), so workers start fast and share the
+imported code copy-on-write; each worker opens its own connection pool and
+hashing pool from the app lifespan after the fork.
+
+Configuration:
+
+    WEB_CONCURRENCY     worker processes (default: the CPU quota, rounded
+                        up, at least 1)
+    GRACEFUL_TIMEOUT    seconds workers get to finish in-flight requests on
+                        SIGTERM (default 25; keep it below the pod's
+                        terminationGracePeriodSeconds)
+    DB_POOL_TOTAL_SIZE  connections per pod, split evenly between workers
+                        into DB_POOL_MAX_SIZE unless that is set (default 10)
+    HASH_WORKERS        per worker; defaults to the CPU quota divided
+                        between the workers
+
+With more than one worker, request metrics are aggregated across workers
+through ``PROMETHEUS_MULTIPROC_DIR`` (a temporary directory unless set),
+and signin refuses to start without ``TOKEN_SECRET``, since each worker
+would otherwise sign tokens with its own random key.
+"""
+
+import argparse
+import math
+import os
+import tempfile
+
+
+def cpu_quota():
+    """CPUs this process may use: the cgroup quota if any, else its affinity."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if quota > 0:
+                return quota / period
+        except (OSError, ValueError):
+            pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def configure_environment(workers, cpus):
+    """Per-worker sizing, applied through the env vars the workers read."""
+    os.environ.setdefault("DB_POOL_MAX_SIZE", str(max(1, int(os.environ.get("DB_POOL_TOTAL_SIZE", "10")) // workers)))
+    os.environ.setdefault("HASH_WORKERS", str(max(1, round(cpus / workers))))
+    if workers > 1:
+        # Must be set before prometheus_client is imported
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="auth-metrics-"))
+
+
+def _worker_class():
+    try:
+        import uvicorn_worker  # noqa: F401
+
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+def _child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Run the auth services under gunicorn.")
+    parser.add_argument("--services", default=None, help="comma separated, as AUTH_SERVICES (default: signin,signup)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.services:
+        os.environ["AUTH_SERVICES"] = args.services
+
+    cpus = cpu_quota()
+    workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or max(1, math.ceil(cpus))
+    configure_environment(workers, cpus)
+
+    # Imported only now, so the sizing above is what the app modules see
+    from gunicorn.app.base import BaseApplication
+
+    from common.app import create_app, services_from_env
+
+    if workers > 1 and "signin" in services_from_env("signin,signup") and not os.environ.get("TOKEN_SECRET"):
+        raise SystemExit(
+            f"TOKEN_SECRET must be set to serve signin from {workers} workers; "
+            "tokens would only verify in the worker that issued them"
+        )
+
+    class Server(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": workers,
+                "worker_class": _worker_class(),
+                "preload_app": True,
+                "graceful_timeout": int(os.environ.get("GRACEFUL_TIMEOUT", "25")),
+                "child_exit": _child_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app(services_from_env("signin,signup"))
+
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
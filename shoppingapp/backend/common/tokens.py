@@ -0,0 +1,182 @@
+"""Signed, short-lived session tokens issued by signin.
+
+Tokens are standard HS256 JWTs, so downstream services can check them with
+any JWT library, or with ``verify()`` from this module, using one HMAC and
+no database or bcrypt work. signin issues two of them:
+
+    access   short-lived, sent with every authenticated request
+    refresh  long-lived, only exchanged at /refresh for a new access token
+
+Configuration:
+
+    TOKEN_SECRET        comma-separated signing keys; the first signs, all
+                        verify, so keys can be rotated without logging
+                        everyone out. Each must be at least 32 bytes and
+                        not a placeholder, e.g. ``openssl rand -base64 48``.
+                        If unset a random per-process key is used and
+                        tokens only verify in that process, which is only
+                        good for a single local process.
+    TOKEN_ISSUER        ``iss`` claim (default "shoppingapp-auth")
+    ACCESS_TOKEN_TTL    seconds (default 900)
+    REFRESH_TOKEN_TTL   seconds (default 604800, one week)
+    TOKEN_VERIFY_CACHE  verified tokens remembered per process, so a client
+                        re-sending the same token skips the HMAC and JSON
+                        decoding (default 10000, 0 disables)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class TokenError(Exception):
+    """The token is malformed, badly signed, expired or of the wrong type."""
+
+
+# HS256 keys shorter than the hash output weaken the signature
+MIN_SECRET_BYTES = 32
+
+# Found in example values that are meant to be replaced
+_PLACEHOLDERS = (b"change", b"replace", b"example", b"secret")
+
+
+def load_secrets():
+    """Signing keys from ``TOKEN_SECRET``; ValueError if any is weak."""
+    secrets = [s.strip().encode() for s in os.environ.get("TOKEN_SECRET", "").split(",") if s.strip()]
+    for secret in secrets:
+        if len(secret) < MIN_SECRET_BYTES or any(marker in secret.lower() for marker in _PLACEHOLDERS):
+            raise ValueError(
+                f"TOKEN_SECRET keys must be at least {MIN_SECRET_BYTES} bytes of random data, not a placeholder"
+            )
+    return secrets
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class TokenSigner:
+    def __init__(self, secrets, issuer, access_ttl, refresh_ttl, cache_size=0):
+        # kid: short fingerprint of each key, so verify() picks the right one
+        self._keys = {hashlib.sha256(secret).hexdigest()[:8]: secret for secret in secrets}
+        self._signing_kid = next(iter(self._keys))
+        self.issuer = issuer
+        self.ttls = {"access": access_ttl, "refresh": refresh_ttl}
+        # Header segments are constant per key, so encode them once. verify()
+        # maps our own headers straight back to their key without decoding
+        self._headers = {
+            kid: _b64encode(json.dumps({"alg": "HS256", "typ": "JWT", "kid": kid}, separators=(",", ":")).encode())
+            for kid in self._keys
+        }
+        self._header_keys = {header: self._keys[kid] for kid, header in self._headers.items()}
+        # token -> claims of tokens whose signature already checked out; the
+        # claims are fixed by the token, only typ and exp are re-checked
+        self._verified = {}
+        self.cache_size = cache_size
+
+    def issue(self, subject, token_type, now=None):
+        now = int(time.time() if now is None else now)
+        claims = {
+            "iss": self.issuer,
+            "sub": subject,
+            "typ": token_type,
+            "iat": now,
+            "exp": now + self.ttls[token_type],
+            "jti": uuid.uuid4().hex,
+        }
+        signing_input = self._headers[self._signing_kid] + b"." + _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signature = hmac.digest(self._keys[self._signing_kid], signing_input, "sha256")
+        return (signing_input + b"." + _b64encode(signature)).decode()
+
+    def verify(self, token, token_type="access", now=None):
+        """Return the claims of a valid token, or raise ``TokenError``."""
+        claims = self._verified.get(token)
+        if claims is None:
+            claims = self._decode(token)
+            if self.cache_size:
+                if len(self._verified) >= self.cache_size:
+                    # Oldest first; expired tokens age out the same way
+                    del self._verified[next(iter(self._verified))]
+                self._verified[token] = claims
+
+        if claims.get("typ") != token_type:
+            raise TokenError(f"expected a {token_type} token")
+        if claims.get("exp", 0) <= (time.time() if now is None else now):
+            raise TokenError("token expired")
+        return claims
+
+    def _decode(self, token):
+        try:
+            raw = token.encode() if isinstance(token, str) else token
+            header_b64, payload_b64, signature_b64 = raw.split(b".")
+            key = self._header_keys.get(header_b64) or self._key_for(header_b64)
+            expected = hmac.digest(key, raw[: -len(signature_b64) - 1], "sha256")
+            if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+                raise TokenError("bad signature")
+            claims = json.loads(_b64decode(payload_b64))
+        except TokenError:
+            raise
+        except (ValueError, AttributeError, TypeError) as e:
+            raise TokenError("malformed token") from e
+        if not isinstance(claims, dict) or claims.get("iss") != self.issuer:
+            raise TokenError("wrong issuer")
+        return claims
+
+    def _key_for(self, header_b64):
+        # Headers written by other JWT libraries (different key order) are
+        # decoded the slow way
+        header = json.loads(_b64decode(header_b64))
+        key = self._keys.get(header.get("kid"))
+        if key is None or header.get("alg") != "HS256":
+            raise TokenError("unknown signing key")
+        return key
+
+
+_signer = None
+
+
+def get_signer():
+    """The process-wide signer, configured from the environment."""
+    global _signer
+    if _signer is None:
+        secrets = load_secrets()
+        if not secrets:
+            logger.warning("TOKEN_SECRET is not set; tokens will only verify in this process")
+            secrets = [os.urandom(32)]
+        _signer = TokenSigner(
+            secrets,
+            issuer=os.environ.get("TOKEN_ISSUER", "shoppingapp-auth"),
+            access_ttl=int(os.environ.get("ACCESS_TOKEN_TTL", "900")),
+            refresh_ttl=int(os.environ.get("REFRESH_TOKEN_TTL", "604800")),
+            cache_size=int(os.environ.get("TOKEN_VERIFY_CACHE", "10000")),
+        )
+    return _signer
+
+
+def issue_access(subject):
+    signer = get_signer()
+    return {
+        "access_token": signer.issue(subject, "access"),
+        "token_type": "bearer",
+        "expires_in": signer.ttls["access"],
+    }
+
+
+def issue_pair(subject):
+    """Access and refresh tokens for a freshly authenticated user."""
+    return {**issue_access(subject), "refresh_token": get_signer().issue(subject, "refresh")}
+
+
+def verify(token, token_type="access"):
+    return get_signer().verify(token, token_type)
@@ -0,0 +1,213 @@
+"""In-process cache of known usernames, used to reject unknown users early.
+
+Most credential-stuffing traffic against ``/signin`` uses usernames that do
+not exist. ``might_exist()`` answers "definitely not a user" from memory so
+signin can return 401 without a DB query. It never answers "no" for a real
+user; a "maybe" just falls through to the normal lookup.
+
+The cache is filled from the ``users`` table at startup, rebuilt
+periodically, and kept current between rebuilds by a ``LISTEN`` on the
+``users_added`` channel (fed by a trigger on ``users``, so inserts made by
+any pod or script are seen). While the cache is not ready, or the listener
+connection is lost, ``might_exist()`` always says "maybe".
+
+Configuration:
+
+    USERNAME_CACHE            "off" (default), "set" or "bloom"
+    USERNAME_CACHE_CAPACITY   max usernames held (default 1000000). A "set"
+                              cache switches itself off above this; a
+                              "bloom" cache is sized for it and its false
+                              positive rate rises beyond it
+    USERNAME_CACHE_FP_RATE    Bloom filter false-positive rate (default 0.01)
+    USERNAME_CACHE_REFRESH    seconds between full rebuilds (default 300)
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+
+import asyncpg
+
+from common import db, metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "users_added"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+
+    def __init__(self, capacity, fp_rate):
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+class KnownUsernames:
+    def __init__(self, kind, capacity, fp_rate, refresh):
+        self.kind = kind
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.refresh = refresh
+        self._known = None
+        self._building = None
+        self._listener = None
+        self._task = None
+
+    def _new(self):
+        return BloomFilter(self.capacity, self.fp_rate) if self.kind == "bloom" else set()
+
+    @property
+    def ready(self):
+        return self._known is not None
+
+    def might_exist(self, username):
+        known = self._known
+        return known is None or username in known
+
+    def add(self, username):
+        for known in (self._known, self._building):
+            if isinstance(known, set) and len(known) >= self.capacity:
+                self._overflow()
+                return
+            if known is not None:
+                known.add(username)
+
+    def _overflow(self):
+        logger.warning("username cache exceeded %d entries; disabling it", self.capacity)
+        self._known = self._building = None
+
+    async def rebuild(self):
+        """Reload every username from the ``users`` table."""
+        self._building = self._new()
+        try:
+            async with db.connection() as conn:
+                async with conn.transaction():
+                    async for record in conn.cursor("SELECT username FROM users", prefetch=10_000):
+                        if self._building is None:
+                            return
+                        if isinstance(self._building, set) and len(self._building) >= self.capacity:
+                            self._overflow()
+                            return
+                        self._building.add(record["username"])
+            if self._listener is not None and not self._listener.is_closed():
+                self._known = self._building
+        finally:
+            self._building = None
+
+    async def _listen(self):
+        self._listener = await asyncpg.connect(**db.connect_kwargs())
+        self._listener.add_termination_listener(self._on_listener_lost)
+        await self._listener.add_listener(CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.add(payload)
+
+    def _on_listener_lost(self, connection):
+        # Inserts could now be missed; stop answering "no" until rebuilt
+        logger.warning("username cache listener lost; disabling until the next rebuild")
+        self._known = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh)
+            try:
+                if self._listener is None or self._listener.is_closed():
+                    await self._listen()
+                await self.rebuild()
+            except Exception:
+                logger.exception("username cache rebuild failed")
+
+    async def start(self):
+        # Listen before the first load so no insert slips in between
+        await self._listen()
+        await self.rebuild()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._listener is not None:
+            self._listener.remove_termination_listener(self._on_listener_lost)
+            await self._listener.close()
+            self._listener = None
+        self._known = None
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "ready": self.ready,
+            "entries": len(self._known) if self._known is not None else 0,
+        }
+
+
+_cache = None
+
+
+async def start_cache():
+    """Create and load the cache, unless ``USERNAME_CACHE`` is off."""
+    global _cache
+    kind = os.environ.get("USERNAME_CACHE", "off").lower()
+    if kind == "off" or _cache is not None:
+        return _cache
+    if kind not in ("set", "bloom"):
+        raise ValueError(f"USERNAME_CACHE must be 'off', 'set' or 'bloom', not {kind!r}")
+    _cache = KnownUsernames(
+        kind=kind,
+        capacity=int(os.environ.get("USERNAME_CACHE_CAPACITY", "1000000")),
+        fp_rate=float(os.environ.get("USERNAME_CACHE_FP_RATE", "0.01")),
+        refresh=float(os.environ.get("USERNAME_CACHE_REFRESH", "300")),
+    )
+    await _cache.start()
+    return _cache
+
+
+async def stop_cache():
+    global _cache
+    if _cache is not None:
+        await _cache.stop()
+        _cache = None
+
+
+def stats():
+    return _cache.stats() if _cache is not None else None
+
+
+metrics.register_gauges("username_cache", stats)
+
+
+def might_exist(username):
+    """False only if ``username`` is certainly not in the ``users`` table."""
+    return _cache is None or _cache.might_exist(username)
+
+
+def probably_exists(username):
+    """True only if a loaded cache holds ``username`` (a Bloom filter may be wrong)."""
+    return _cache is not None and _cache.ready and _cache.might_exist(username)
+
+
+def add(username):
+    if _cache is not None:
+        _cache.add(username)
@@ -0,0 +1,131 @@
+"""Input limits for the auth routes, applied before any DB or hash work.
+
+Field types for the request models. pydantic compiles their constraints
+into the model's validator when the class is defined, so checking them is
+a single pass over each string:
+
+    Username      signin: 1-255 characters (the column width), no control
+                  characters
+    NewUsername   signup: 3-64 characters from ``A-Z a-z 0-9 . _ @ + -``
+    Password      signin: 1-1024 characters, so passwords set before these
+                  limits existed still verify
+    NewPassword   signup: 1-72 UTF-8 bytes (bcrypt ignores anything past
+                  72 bytes) and no NUL characters
+
+    BcryptHash    an existing ``$2a$``/``$2b$``/``$2y$`` bcrypt hash, for
+                  bulk imports of users from other shops
+
+``install(app)`` also caps request bodies at ``MAX_BODY_BYTES`` (default
+4096), or at a larger per-path limit for routes that stream their body
+(bulk import). A ``Content-Length`` over the cap is refused with 413
+before any of the body is read; a chunked body is counted as it streams in and reading
+stops at the first chunk past the cap. Validation errors (422) are
+returned without echoing the rejected input, so passwords never appear in
+a response.
+"""
+
+import os
+from typing import Annotated
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import AfterValidator, StringConstraints
+
+from common import responses
+
+Username = Annotated[str, StringConstraints(strict=True, min_length=1, max_length=255, pattern=r"^[^\x00-\x1f\x7f]+$")]
+NewUsername = Annotated[str, StringConstraints(strict=True, min_length=3, max_length=64, pattern=r"^[A-Za-z0-9._@+-]+$")]
+Password = Annotated[str, StringConstraints(strict=True, min_length=1, max_length=1024)]
+
+
+def _bcrypt_length(password):
+    if len(password.encode("utf-8")) > 72:
+        raise ValueError("Password must be at most 72 bytes")
+    return password
+
+
+NewPassword = Annotated[
+    str,
+    StringConstraints(strict=True, min_length=1, max_length=72, pattern=r"^[^\x00]+$"),
+    AfterValidator(_bcrypt_length),
+]
+
+BcryptHash = Annotated[str, StringConstraints(strict=True, pattern=r"^\$2[aby]\$(0[4-9]|[12][0-9]|3[01])\$[./A-Za-z0-9]{53}$")]
+
+
+_TOO_LARGE = responses.constant({"detail": "Request body too large"}, 413)
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=413, detail="Request body too large")
+
+
+class BodyLimitMiddleware:
+    """Pure ASGI middleware refusing request bodies over ``max_bytes``."""
+
+    def __init__(self, app, max_bytes, limits=None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.limits = limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.limits.get(scope["path"], self.max_bytes)
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > max_bytes:
+                    await self._reject(scope, send)
+                    return
+                break
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside the app, FastAPI turns this into the 413
+                    # response itself; raised in a middleware that reads the
+                    # body (the rate limiter), it is caught below
+                    raise BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge:
+            if started:
+                raise
+            await self._reject(scope, send)
+
+    async def _reject(self, scope, send):
+        response = _TOO_LARGE()
+        # The rest of the body is never read, so the connection cannot be reused
+        response.raw_headers.append((b"connection", b"close"))
+        await response(scope, None, send)
+
+
+async def validation_exception_handler(request, exc):
+    errors = [{"loc": error["loc"], "msg": error["msg"], "type": error["type"]} for error in exc.errors()]
+    return responses.json({"detail": errors}, status_code=422)
+
+
+def install(app, limits=None):
+    """Cap request bodies on ``app`` and keep rejected input out of 422s.
+
+    ``limits`` maps paths to their own cap in bytes.
+    """
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_middleware(BodyLimitMiddleware, max_bytes=int(os.environ.get("MAX_BODY_BYTES", "4096")), limits=limits)
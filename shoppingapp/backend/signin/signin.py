@@ -1,66 +1,12 @@
-import os
-
-import mangum
-import psycopg2
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from passlib.hash import bcrypt
-from psycopg2.extras import RealDictCursor
-from pydantic import BaseModel
 
+# Before the app is imported: some settings (such as JSON_ENCODER) are read
+# when their module is imported
 load_dotenv()
 
-app = FastAPI()
-
-# Add CORS Middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # In production, specify actual origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Database configuration using environment variables for security
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME")
-DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
-DB_PORT = os.environ.get("DB_PORT", "5432")
-
-
-# Schema for signin data
-class SigninData(BaseModel):
-    username: str
-    password: str
-
-
-@app.post("/signin")
-def signin(user: SigninData):
-    try:
-        # Connect to PostgreSQL
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT,
-        )
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check if the user exists
-        cursor.execute("SELECT * FROM users WHERE username = %s", (user.username,))
-        db_user = cursor.fetchone()
-        if not db_user or not bcrypt.verify(user.password, db_user["password_hash"]):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        cursor.close()
-        conn.close()
+from common.app import create_app, services_from_env  # noqa: E402
 
-        return {"message": "Sign-in successful!"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# The signin routes, plus any others listed in AUTH_SERVICES; see common/app.py
+app = create_app(services_from_env("signin"))
 
-# Create handler for AWS Lambda
-# handler = mangum.Mangum(app)
\ No newline at end of file
+# For AWS Lambda, use common.lambda_handler.handler instead
@@ -0,0 +1,133 @@
+import asyncio
+
+from common.admission import AdmissionController, AdmissionMiddleware, Route
+
+
+def controller(limit=10, queue_timeout=1.0, workers=1, **routes):
+    c = AdmissionController(limit=limit, queue_timeout=queue_timeout, workers=workers)
+    for path, route in routes.items():
+        c.add_route(f"/{path}", route)
+    return c
+
+
+async def settle():
+    # Let woken waiters run past asyncio.wait_for and shield
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_route_limits_scale_with_hashing_workers():
+    c = controller(workers=4, signin=Route(0, 2, 4), bulk=Route(2, 1, 0, scaled=False))
+    assert (c.gates["/signin"].limit, c.gates["/signin"].queue_limit) == (8, 16)
+    assert (c.gates["/bulk"].limit, c.gates["/bulk"].queue_limit) == (1, 0)
+
+
+def test_env_overrides_are_absolute(monkeypatch):
+    monkeypatch.setenv("ADMISSION_SIGNIN_CONCURRENCY", "3")
+    c = controller(workers=4, signin=Route(0, 2, 4))
+    assert c.gates["/signin"].limit == 3
+
+
+def test_sheds_when_the_queue_is_full():
+    async def run():
+        c = controller(signin=Route(0, 1, 1))
+        gate = c.gates["/signin"]
+        assert await c.acquire(gate)
+        waiter = asyncio.create_task(c.acquire(gate))
+        await settle()
+        assert gate.waiting == 1
+        assert not await c.acquire(gate)
+        assert gate.rejected == 1
+        c.release(gate)
+        assert await waiter
+        c.release(gate)
+        assert (c.active, gate.active, gate.waiting) == (0, 0, 0)
+
+    asyncio.run(run())
+
+
+def test_waiters_time_out():
+    async def run():
+        c = controller(queue_timeout=0.01, signin=Route(0, 1, 4))
+        gate = c.gates["/signin"]
+        assert await c.acquire(gate)
+        assert not await c.acquire(gate)
+        assert (gate.waiting, gate.rejected) == (0, 1)
+
+    asyncio.run(run())
+
+
+def test_higher_priority_waiters_are_admitted_first():
+    async def run():
+        c = controller(limit=1, signin=Route(0, 1, 4), signup=Route(1, 1, 4))
+        signin, signup = c.gates["/signin"], c.gates["/signup"]
+        assert await c.acquire(signup)
+        admitted = []
+
+        async def wait(gate, name):
+            await c.acquire(gate)
+            admitted.append(name)
+
+        # signup queued first, signin second
+        tasks = [asyncio.create_task(wait(signup, "signup")), asyncio.create_task(wait(signin, "signin"))]
+        await settle()
+        c.release(signup)
+        await settle()
+        assert admitted == ["signin"]
+        c.release(signin)
+        await asyncio.gather(*tasks)
+        assert admitted == ["signin", "signup"]
+
+    asyncio.run(run())
+
+
+def test_global_limit_applies_across_routes():
+    async def run():
+        c = controller(limit=2, signin=Route(0, 2, 0), signup=Route(1, 2, 0))
+        assert await c.acquire(c.gates["/signin"])
+        assert await c.acquire(c.gates["/signup"])
+        assert not await c.acquire(c.gates["/signin"])
+
+    asyncio.run(run())
+
+
+def test_unshared_routes_stay_out_of_the_global_cap():
+    async def run():
+        c = controller(limit=1, signin=Route(0, 1, 0), bulk=Route(2, 1, 0, scaled=False, shared=False))
+        bulk = c.gates["/bulk"]
+        assert await c.acquire(bulk)
+        assert not await c.acquire(bulk)
+        assert await c.acquire(c.gates["/signin"])
+        c.release(bulk)
+        assert c.active == 1
+
+    asyncio.run(run())
+
+
+def call(app, method, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]
+
+
+def test_middleware_sheds_with_503_but_passes_preflights():
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    c = controller(signin=Route(0, 1, 0))
+    c.gates["/signin"].active = c.gates["/signin"].limit
+    c.active = 1
+    app = AdmissionMiddleware(ok, controller=c)
+    response = call(app, "POST", "/signin")
+    assert response["status"] == 503
+    assert (b"retry-after", b"1") in response["headers"]
+    assert call(app, "OPTIONS", "/signin")["status"] == 200
+    assert call(app, "POST", "/unguarded")["status"] == 200
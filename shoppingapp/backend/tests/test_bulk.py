@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+from common import bulk
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def rows(fmt, *chunks):
+    async def collect():
+        return [row async for row in bulk.read_rows(stream(*chunks), fmt)]
+
+    return asyncio.run(collect())
+
+
+def ndjson(*objects):
+    return b"".join(json.dumps(o).encode() + b"\n" for o in objects)
+
+
+def test_ndjson_rows_split_across_chunks():
+    data = ndjson({"username": "alice"}, {"username": "bob"})
+    assert rows("ndjson", data[:7], data[7:20], data[20:]) == [(1, {"username": "alice"}, None), (2, {"username": "bob"}, None)]
+
+
+def test_ndjson_bad_lines_are_reported_and_blank_lines_skipped():
+    assert rows("ndjson", b'not json\n\n[1]\n{"username": "a"}') == [
+        (1, None, "invalid JSON"),
+        (3, None, "expected a JSON object"),
+        (4, {"username": "a"}, None),
+    ]
+
+
+def test_csv_uses_the_header_and_drops_empty_values():
+    data = "﻿username,password,password_hash\r\nalice,pw,\r\n".encode()
+    assert rows("csv", data) == [(2, {"username": "alice", "password": "pw"}, None)]
+
+
+def test_invalid_utf8_is_reported_not_replaced():
+    assert rows("ndjson", b'{"username": "a", "password": "p\xff"}\n') == [(1, None, "invalid UTF-8")]
+    with pytest.raises(bulk.BulkError):
+        rows("csv", b"user\xffname\n")
+
+
+@pytest.mark.parametrize("split", [False, True])
+def test_overlong_lines_are_refused(split):
+    line = b'{"username": "' + b"x" * bulk.MAX_LINE_BYTES + b'"}\n'
+    chunks = [line[:100], line[100:]] if split else [line + ndjson({"username": "a"})]
+    with pytest.raises(bulk.BulkError, match="line longer than"):
+        rows("ndjson", *chunks)
+
+
+def run(*chunks, size=2, fmt="ndjson"):
+    processed = []
+
+    async def process_chunk(chunk):
+        processed.append([line for line, _ in chunk])
+        return [{"line": line, "username": user.username, "status": "created", "error": None} for line, user in chunk]
+
+    async def collect():
+        results = bulk._run(stream(*chunks), fmt, size, bulk.BulkUser, process_chunk, ("created", "duplicate"))
+        return [result async for result in results]
+
+    return asyncio.run(collect()), processed
+
+
+HASH = "$2b$12$" + "a" * 53
+
+
+def test_rows_are_processed_in_chunks_with_a_summary():
+    data = ndjson(*({"username": f"user{i}", "password_hash": HASH} for i in range(5)))
+    results, processed = run(data)
+    assert processed == [[1, 2], [3, 4], [5]]
+    assert [r["line"] for r in results[:-1]] == [1, 2, 3, 4, 5]
+    summary = results[-1]["summary"]
+    assert (summary["created"], summary["duplicate"], summary["invalid"]) == (5, 0, 0)
+    assert "error" not in summary
+
+
+def test_invalid_rows_are_reported_without_processing():
+    data = ndjson({"username": "alice", "password": "pw", "password_hash": HASH}, {"username": "x"}, {"username": "bob", "password": "pw"})
+    results, processed = run(data)
+    assert processed == [[3]]
+    assert [(r["line"], r["status"]) for r in results[:-1]] == [(1, "invalid"), (2, "invalid"), (3, "created")]
+    assert "exactly one of password and password_hash" in results[0]["error"]
+
+
+def test_results_keep_input_order():
+    data = ndjson({"username": "user1", "password": "pw"}, {"username": "user2", "password": "pw"}, {"username": "x"})
+    data += ndjson({"username": "user4", "password": "pw"}, {"username": "y"}, {"username": "z"})
+    results, processed = run(data, size=3)
+    assert processed == [[1, 2], [4]]
+    assert [r["line"] for r in results[:-1]] == [1, 2, 3, 4, 5, 6]
+    assert results[-1]["summary"]["invalid"] == 3
+
+
+def test_rows_read_before_a_broken_line_are_still_processed():
+    data = ndjson(*({"username": f"user{i}", "password": "pw"} for i in range(5)))
+    results, processed = run(data, b'{"username": "' + b"x" * (bulk.MAX_LINE_BYTES + 1), size=10)
+    assert processed == [[1, 2, 3, 4, 5]]
+    summary = results[-1]["summary"]
+    assert summary["created"] == 5
+    assert summary["error"] == f"line longer than {bulk.MAX_LINE_BYTES} bytes"
+
+
+def test_format_detection():
+    assert bulk.detect_format(None, "text/csv") == "csv"
+    assert bulk.detect_format(None, None) == "ndjson"
+    assert bulk.detect_format("CSV", "application/x-ndjson") == "csv"
+    with pytest.raises(bulk.BulkError):
+        bulk.detect_format("xml", None)
+
+
+def test_token_check(monkeypatch):
+    monkeypatch.delenv("BULK_IMPORT_TOKEN", raising=False)
+    assert bulk.check_token("Bearer anything", "BULK_IMPORT_TOKEN") is None
+    monkeypatch.setenv("BULK_IMPORT_TOKEN", "s3cret")
+    assert bulk.check_token("Bearer s3cret", "BULK_IMPORT_TOKEN") is True
+    assert bulk.check_token("Bearer wrong", "BULK_IMPORT_TOKEN") is False
+    assert bulk.check_token(None, "BULK_IMPORT_TOKEN") is False
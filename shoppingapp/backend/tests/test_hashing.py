@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from common import hashing
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# passlib must not be imported yet, so this runs in a fresh interpreter
+COLD_THREADS = """
+import threading
+from common import hashing
+
+errors = []
+
+def hash_one():
+    try:
+        hashing._hash("password", 4)
+    except Exception as e:
+        errors.append(repr(e))
+
+threads = [threading.Thread(target=hash_one) for _ in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(errors)
+"""
+
+
+def test_concurrent_first_use():
+    result = subprocess.run([sys.executable, "-c", COLD_THREADS], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_verify_and_rehash(monkeypatch):
+    monkeypatch.setenv("BCRYPT_ROUNDS", "5")
+    password_hash = hashing._hash("password", 4)
+    assert hashing._verify("password", password_hash)
+    assert not hashing._verify("wrong", password_hash)
+    assert hashing.needs_rehash(password_hash)
+    assert not hashing.needs_rehash(hashing._hash("password", 5))
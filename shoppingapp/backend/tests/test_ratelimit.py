@@ -0,0 +1,156 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from common import ratelimit
+from common.ratelimit import Limit, MemoryStore, RateLimiter, RateLimitMiddleware
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def take(store, key, limit):
+    return asyncio.run(store.take(key, limit))
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    store, limit = MemoryStore(max_keys=100), Limit(rate=1, burst=3)
+    assert [take(store, "ip:a", limit) for _ in range(3)] == [0, 0, 0]
+    assert take(store, "ip:a", limit) == pytest.approx(1.0)
+    clock.now += 1
+    assert take(store, "ip:a", limit) == 0
+    assert take(store, "ip:b", limit) == 0
+
+
+def test_peek_takes_nothing(clock):
+    store, limit = MemoryStore(max_keys=100), Limit(rate=1, burst=1)
+    assert asyncio.run(store.peek("user:a", limit)) == 0
+    assert store.stats()["keys"] == 0
+    assert take(store, "user:a", limit) == 0
+    assert asyncio.run(store.peek("user:a", limit)) == pytest.approx(1.0)
+
+
+def test_peek_does_not_evict(clock):
+    store, limit = MemoryStore(max_keys=2), Limit(rate=0.001, burst=1)
+    take(store, "user:target", limit)
+    for i in range(10):
+        asyncio.run(store.peek(f"user:{i}", limit))
+    assert take(store, "user:target", limit) > 0
+
+
+def test_refund_returns_a_token(clock):
+    store, limit = MemoryStore(max_keys=100), Limit(rate=0.001, burst=2)
+    assert [take(store, "user:a", limit) for _ in range(2)] == [0, 0]
+    asyncio.run(store.refund("user:a", limit))
+    assert take(store, "user:a", limit) == 0
+    assert take(store, "user:a", limit) > 0
+    asyncio.run(store.refund("user:b", limit))
+    assert store.stats()["keys"] == 1
+
+
+def test_store_is_bounded(clock):
+    store, limit = MemoryStore(max_keys=10), Limit(rate=0.001, burst=5)
+    for i in range(50):
+        take(store, f"ip:{i}", limit)
+    assert store.stats() == {"keys": 10, "evictions": 40}
+
+
+def test_full_buckets_are_swept(clock):
+    store, limit = MemoryStore(max_keys=100), Limit(rate=1, burst=2)
+    take(store, "ip:old", limit)
+    clock.now += 10
+    take(store, "ip:new", limit)
+    assert store.stats()["keys"] == 1
+
+
+def test_client_ip_from_trusted_hops(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TRUST_FORWARDED", "true")
+    monkeypatch.setenv("RATE_LIMIT_PROXY_HOPS", "2")
+    limiter = RateLimiter(MemoryStore())
+    scope = {"headers": [(b"x-forwarded-for", b"6.6.6.6, 1.2.3.4, 10.0.0.1")], "client": ("10.0.0.2", 1)}
+    assert limiter.client_ip(scope) == "1.2.3.4"
+    assert limiter.client_ip({"headers": [], "client": ("10.0.0.2", 1)}) == "10.0.0.2"
+
+
+def test_forwarded_header_ignored_unless_trusted(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_TRUST_FORWARDED", raising=False)
+    limiter = RateLimiter(MemoryStore())
+    scope = {"headers": [(b"x-forwarded-for", b"6.6.6.6")], "client": ("10.0.0.2", 1)}
+    assert limiter.client_ip(scope) == "10.0.0.2"
+
+
+async def request(app, username, method="POST"):
+    sent = []
+    body = json.dumps({"username": username, "password": "x"}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": "/signin", "headers": [], "client": ("127.0.0.1", 1)}
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+
+def signin(app, username, method="POST"):
+    return asyncio.run(request(app, username, method))
+
+
+def test_only_failures_use_up_the_username_bucket(monkeypatch, clock):
+    monkeypatch.setenv("RATE_LIMIT_IP_RATE", "0")
+    monkeypatch.setenv("RATE_LIMIT_USER_BURST", "2")
+    limiter = RateLimiter(MemoryStore())
+
+    async def login(scope, receive, send):
+        body = json.loads((await receive())["body"])
+        if body["username"] == "alice":
+            await limiter.refund("alice")
+            status = 200
+        else:
+            status = 401
+        await send({"type": "http.response.start", "status": status, "headers": []})
+
+    app = RateLimitMiddleware(login, limiter=limiter, routes={"/signin": ("ip", "username")})
+    assert [signin(app, "alice") for _ in range(5)] == [200] * 5
+    assert [signin(app, "bob") for _ in range(3)] == [401, 401, 429]
+
+
+def test_concurrent_guesses_share_the_burst(monkeypatch, clock):
+    monkeypatch.setenv("RATE_LIMIT_IP_RATE", "0")
+    monkeypatch.setenv("RATE_LIMIT_USER_BURST", "3")
+    verified = 0
+
+    async def wrong_password(scope, receive, send):
+        nonlocal verified
+        await receive()
+        await asyncio.sleep(0.01)
+        verified += 1
+        await send({"type": "http.response.start", "status": 401, "headers": []})
+
+    app = RateLimitMiddleware(wrong_password, limiter=RateLimiter(MemoryStore()), routes={"/signin": ("username",)})
+
+    async def main():
+        return await asyncio.gather(*(request(app, "alice") for _ in range(40)))
+
+    statuses = asyncio.run(main())
+    assert verified == 3
+    assert statuses.count(429) == 37
+
+
+def test_preflights_are_not_limited(monkeypatch, clock):
+    monkeypatch.setenv("RATE_LIMIT_IP_BURST", "1")
+
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    app = RateLimitMiddleware(ok, limiter=RateLimiter(MemoryStore()), routes={"/signin": ("ip",)})
+    assert [signin(app, "alice", method="OPTIONS") for _ in range(3)] == [200] * 3
+    assert [signin(app, "alice") for _ in range(2)] == [200, 429]
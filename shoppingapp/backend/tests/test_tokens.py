@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from common import revocation, tokens
+from common.tokens import TokenError, TokenSigner
+
+OLD_KEY = b"o" * 32
+NEW_KEY = b"n" * 32
+
+
+def signer(*keys, cache_size=0):
+    return TokenSigner(list(keys) or [NEW_KEY], "test-issuer", access_ttl=60, refresh_ttl=3600, cache_size=cache_size)
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def test_issue_and_verify():
+    s = signer()
+    claims = s.verify(s.issue("alice", "access", now=1000), now=1001)
+    assert (claims["sub"], claims["typ"], claims["iss"]) == ("alice", "access", "test-issuer")
+    assert claims["exp"] == 1060
+    assert claims["jti"]
+
+
+def test_every_token_has_its_own_id():
+    s = signer()
+    assert s.verify(s.issue("alice", "access"))["jti"] != s.verify(s.issue("alice", "access"))["jti"]
+
+
+@pytest.mark.parametrize("cache_size", [0, 10])
+def test_expired_tokens_are_refused(cache_size):
+    s = signer(cache_size=cache_size)
+    token = s.issue("alice", "access", now=1000)
+    s.verify(token, now=1059)
+    with pytest.raises(TokenError, match="expired"):
+        s.verify(token, now=1060)
+
+
+@pytest.mark.parametrize("cache_size", [0, 10])
+def test_token_type_is_checked(cache_size):
+    s = signer(cache_size=cache_size)
+    token = s.issue("alice", "refresh")
+    assert s.verify(token, "refresh")["typ"] == "refresh"
+    with pytest.raises(TokenError, match="expected a access token"):
+        s.verify(token, "access")
+
+
+def test_tampered_tokens_are_refused():
+    s = signer()
+    header, payload, signature = s.issue("alice", "access").split(".")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=="))
+    forged = b64(json.dumps({**claims, "sub": "mallory"}).encode()).decode()
+    with pytest.raises(TokenError, match="bad signature"):
+        s.verify(f"{header}.{forged}.{signature}")
+    with pytest.raises(TokenError, match="malformed"):
+        s.verify("not-a-token")
+
+
+def test_other_keys_and_issuers_are_refused():
+    other = signer(b"x" * 32)
+    with pytest.raises(TokenError, match="unknown signing key"):
+        signer().verify(other.issue("alice", "access"))
+    foreign = TokenSigner([NEW_KEY], "someone-else", 60, 3600)
+    with pytest.raises(TokenError, match="wrong issuer"):
+        signer().verify(foreign.issue("alice", "access"))
+
+
+def test_rotation_keeps_old_tokens_valid():
+    before = signer(OLD_KEY)
+    after = signer(NEW_KEY, OLD_KEY)
+    old_token = before.issue("alice", "access")
+    assert after.verify(old_token)["sub"] == "alice"
+    new_token = after.issue("bob", "access")
+    with pytest.raises(TokenError):
+        before.verify(new_token)
+    # Once the old key is dropped, its tokens stop verifying
+    with pytest.raises(TokenError):
+        signer(NEW_KEY).verify(old_token)
+
+
+def test_headers_from_other_libraries_verify():
+    s = signer()
+    kid = hashlib.sha256(NEW_KEY).hexdigest()[:8]
+    header = b64(json.dumps({"kid": kid, "typ": "JWT", "alg": "HS256"}).encode())
+    payload = b64(json.dumps({"iss": "test-issuer", "sub": "alice", "typ": "access", "exp": 2000}).encode())
+    signature = b64(hmac.digest(NEW_KEY, header + b"." + payload, "sha256"))
+    assert s.verify(b".".join([header, payload, signature]).decode(), now=1000)["sub"] == "alice"
+
+
+def test_verified_cache_is_bounded():
+    s = signer(cache_size=2)
+    for subject in ("a", "b", "c"):
+        s.verify(s.issue(subject, "access"))
+    assert len(s._verified) == 2
+
+
+@pytest.mark.parametrize("secret", ["change-me", "short", "replace-this-with-a-real-secret-value-please"])
+def test_weak_secrets_are_refused(monkeypatch, secret):
+    monkeypatch.setenv("TOKEN_SECRET", secret)
+    with pytest.raises(ValueError):
+        tokens.load_secrets()
+
+
+def test_secrets_are_comma_separated(monkeypatch):
+    monkeypatch.setenv("TOKEN_SECRET", f"{'a' * 32}, {'b' * 40}")
+    assert tokens.load_secrets() == [b"a" * 32, b"b" * 40]
+
+
+@pytest.mark.parametrize("claim", ["jti", "sub"])
+def test_tokens_missing_required_claims_are_refused(monkeypatch, claim):
+    s = signer()
+    monkeypatch.setattr(tokens, "_signer", s)
+    claims = {"iss": "test-issuer", "sub": "alice", "typ": "access", "exp": 4000000000, "jti": "abc"}
+    del claims[claim]
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT", "kid": hashlib.sha256(NEW_KEY).hexdigest()[:8]}).encode())
+    payload = b64(json.dumps(claims).encode())
+    token = b".".join([header, payload, b64(hmac.digest(NEW_KEY, header + b"." + payload, "sha256"))]).decode()
+    assert s.verify(token)["iss"] == "test-issuer"
+    with pytest.raises(TokenError, match=f"no {claim}"):
+        revocation.verify(token)
@@ -0,0 +1,43 @@
+from common import usernames
+from common.usernames import BloomFilter, KnownUsernames
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter(capacity=1000, fp_rate=0.01)
+    names = [f"user{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+    assert len(bloom) == 1000
+
+
+def test_false_positive_rate_near_target_at_capacity():
+    bloom = BloomFilter(capacity=10_000, fp_rate=0.01)
+    for i in range(10_000):
+        bloom.add(f"user{i}")
+    false_positives = sum(f"ghost{i}" in bloom for i in range(20_000))
+    assert false_positives / 20_000 < 0.02
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=100, fp_rate=0.01)
+    assert "anyone" not in bloom
+    assert len(bloom) == 0
+
+
+def test_sized_from_capacity_and_rate():
+    small = BloomFilter(capacity=1000, fp_rate=0.01)
+    strict = BloomFilter(capacity=1000, fp_rate=0.0001)
+    assert strict.size > small.size
+    assert strict.hashes > small.hashes
+
+
+def test_probably_exists_only_with_a_loaded_cache(monkeypatch):
+    monkeypatch.setattr(usernames, "_cache", None)
+    assert usernames.might_exist("alice") and not usernames.probably_exists("alice")
+
+    cache = KnownUsernames("set", capacity=10, fp_rate=0.01, refresh=300)
+    monkeypatch.setattr(usernames, "_cache", cache)
+    assert not usernames.probably_exists("alice")
+    cache._known = {"alice"}
+    assert usernames.probably_exists("alice") and not usernames.probably_exists("bob")
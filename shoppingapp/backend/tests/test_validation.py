@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from common.validation import BodyLimitMiddleware, NewPassword, NewUsername
+
+
+async def read_body(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+def post(app, chunks, path="/signin", content_length=None):
+    pending = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return pending.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    asyncio.run(app(scope, receive, send))
+    return sent, pending
+
+
+def test_small_bodies_pass_through():
+    sent, _ = post(BodyLimitMiddleware(read_body, max_bytes=10), [b"12345", b"67890"])
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b"1234567890"
+
+
+def test_content_length_over_the_cap_is_refused_unread():
+    sent, pending = post(BodyLimitMiddleware(read_body, max_bytes=10), [b"x" * 11], content_length=11)
+    assert sent[0]["status"] == 413
+    assert (b"connection", b"close") in sent[0]["headers"]
+    assert len(pending) == 1
+
+
+def test_bad_content_length_is_refused():
+    sent, _ = post(BodyLimitMiddleware(read_body, max_bytes=10), [b"x"], content_length="1e9")
+    assert sent[0]["status"] == 413
+
+
+def test_chunked_body_stops_at_the_first_chunk_past_the_cap():
+    sent, pending = post(BodyLimitMiddleware(read_body, max_bytes=10), [b"x" * 6, b"x" * 6, b"x" * 6])
+    assert sent[0]["status"] == 413
+    assert len(pending) == 1
+
+
+def test_per_path_limits():
+    app = BodyLimitMiddleware(read_body, max_bytes=10, limits={"/signup/bulk": 100})
+    assert post(app, [b"x" * 50], path="/signup/bulk")[0][0]["status"] == 200
+    assert post(app, [b"x" * 50], path="/signup")[0][0]["status"] == 413
+
+
+class Signup(BaseModel):
+    username: NewUsername
+    password: NewPassword
+
+
+@pytest.mark.parametrize(
+    "username, password",
+    [("ab", "pw"), ("bad name", "pw"), ("a" * 65, "pw"), ("alice", ""), ("alice", "é" * 37), ("alice", "pw\x00")],
+)
+def test_signup_fields_are_bounded(username, password):
+    with pytest.raises(ValidationError):
+        Signup(username=username, password=password)
+
+
+def test_passwords_up_to_72_bytes_are_accepted():
+    assert Signup(username="alice.b@shop", password="é" * 36).password == "é" * 36